@@ -32,13 +32,77 @@ type FormValues = {
   root?: string;
 };
 
-type GenerateResponse = {
-  session?: {
-    id: string;
-    status?: string | null;
-  } | null;
+type GenerateJob = {
+  id: string;
+  session_id: string;
+  status: "queued" | "running" | "done" | "failed";
+  stage?: string | null;
+  error?: string | null;
 };
 
+type GenerateJobResponse = {
+  job: GenerateJob;
+};
+
+const JOB_POLL_INTERVAL_MS = 3000;
+
+const fetchGenerateJob = async (sessionId: string) => {
+  const response = await fetch(`${API_BASE}/api/generate/jobs/${sessionId}`);
+  if (!response.ok) {
+    const text = await response.text();
+    throw new Error(text || "PDF生成の進捗を取得できませんでした。");
+  }
+  const { job } = (await response.json()) as GenerateJobResponse;
+  return job;
+};
+
+const pollGenerateJob = async (sessionId: string) => {
+  for (;;) {
+    const job = await fetchGenerateJob(sessionId);
+    if (job.status === "done") {
+      return job;
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "PDF生成に失敗しました。");
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
+const waitForGenerateJob = (sessionId: string) =>
+  new Promise<GenerateJob>((resolve, reject) => {
+    const source = new EventSource(
+      `${API_BASE}/api/generate/jobs/${sessionId}/events`,
+    );
+    source.addEventListener("progress", (event) => {
+      const job = JSON.parse(
+        (event as MessageEvent<string>).data,
+      ) as GenerateJob;
+      if (job.status === "done") {
+        source.close();
+        resolve(job);
+      } else if (job.status === "failed") {
+        source.close();
+        reject(new Error(job.error || "PDF生成に失敗しました。"));
+      }
+    });
+    source.addEventListener("error", (event) => {
+      const data = (event as MessageEvent<string | undefined>).data;
+      if (data) {
+        // Only an error payload sent by the server ends the wait.
+        source.close();
+        const { detail } = JSON.parse(data) as { detail?: string };
+        reject(new Error(detail || "PDF生成の進捗を取得できませんでした。"));
+        return;
+      }
+      // Connection drops reconnect on their own; once the browser gives up,
+      // the job keeps running, so follow it by polling instead.
+      if (source.readyState === EventSource.CLOSED) {
+        pollGenerateJob(sessionId).then(resolve, reject);
+      }
+    });
+  });
+
 export const ManualGenerateForm = forwardRef<
   ManualGenerateFormHandle,
   ManualGenerateFormProps
@@ -155,7 +219,7 @@ export const ManualGenerateForm = forwardRef<
 
     const generateMutation = useMutation({
       mutationFn: async (formData: FormData) => {
-        const response = await fetch(`${API_BASE}/api/generate`, {
+        const response = await fetch(`${API_BASE}/api/generate/jobs`, {
           method: "POST",
           body: formData,
         });
@@ -165,13 +229,12 @@ export const ManualGenerateForm = forwardRef<
           throw new Error(text || "PDF生成に失敗しました。");
         }
 
-        return (await response.json()) as GenerateResponse;
+        const { job } = (await response.json()) as GenerateJobResponse;
+        return await waitForGenerateJob(job.session_id);
       },
-      onSuccess: (data) => {
+      onSuccess: (job) => {
         queryClient.invalidateQueries({ queryKey: ["sessions"] });
-        if (data.session?.id) {
-          navigate(`/sessions/${data.session.id}/summary`);
-        }
+        navigate(`/sessions/${job.session_id}/summary`);
       },
       onError: (err) => {
         const message =
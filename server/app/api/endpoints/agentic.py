@@ -1,4 +1,4 @@
-import html as html_lib
+from typing import Any
 
 from fastapi import APIRouter, HTTPException
 
@@ -16,9 +16,19 @@ from app.services.generate import (
     generate_manual_html_with_proposal,
     generate_manual_pdf,
 )
-from app.services.search import search_official_manual
+from app.services.reference_cache import find_official_manual
+from app.services.reference_index import prepare_search_reference
+from app.services.reference_prefetch import prefetched_reference
 from app.services.sessions import get_session, update_session
+from app.services.speculation import (
+    SpeculativeRender,
+    cancel_speculation,
+    proposal_key,
+    start_speculation,
+    take_speculation,
+)
 from app.services.storage import upload_bytes
+from app.utils.concurrency import run_blocking
 from app.utils.dates import build_issued_on
 
 router = APIRouter()
@@ -29,7 +39,6 @@ def _build_agentic_context(session: dict) -> dict:
     return {
         "place": session.get("place") or {},
         "answers": inputs.get("step2") or {},
-        "generated_html": inputs.get("html") or "",
         "generated_markdown": inputs.get("markdown") or "",
     }
 
@@ -48,27 +57,139 @@ def _coerce_history(raw_history: list[dict] | None) -> list[dict[str, str]]:
     return history
 
 
+def _coerce_illustration_images(raw_illustrations: Any) -> list[IllustrationImage]:
+    illustration_images: list[IllustrationImage] = []
+    if not isinstance(raw_illustrations, list):
+        return illustration_images
+    for item in raw_illustrations:
+        if not isinstance(item, dict):
+            continue
+        illustration_id = item.get("id")
+        public_url_value = item.get("public_url")
+        prompt_text = item.get("prompt")
+        if (
+            not isinstance(illustration_id, str)
+            or not isinstance(public_url_value, str)
+            or not isinstance(prompt_text, str)
+        ):
+            continue
+        illustration_images.append(
+            {
+                "id": illustration_id,
+                "prompt": prompt_text,
+                "public_url": public_url_value,
+                "gcs_uri": item.get("gcs_uri"),
+                "content_type": item.get("content_type"),
+                "alt": item.get("alt"),
+            }
+        )
+    return illustration_images
+
+
+def _manual_cover(inputs: dict) -> tuple[str, str, str, str]:
+    step1 = inputs.get("step1") or {}
+    step2 = inputs.get("step2") or {}
+    name = ""
+    author = ""
+    issued_on = ""
+    if isinstance(step1, dict):
+        name = str(step1.get("name") or "").strip()
+        author = str(step1.get("author") or "").strip()
+    if isinstance(step2, dict) and isinstance(step2.get("issued_on"), str):
+        issued_on = step2["issued_on"].strip()
+    if not issued_on:
+        issued_on = build_issued_on()
+    manual_title = f"{name} 防災マニュアル" if name else "防災マニュアル"
+    return manual_title, name, author, issued_on
+
+
+def _proposal_render_key(
+    proposal: str,
+    previous_markdown: str,
+    previous_html: str,
+    illustration_images: list[IllustrationImage],
+    cover: tuple[str, str, str, str],
+) -> str:
+    return proposal_key(
+        proposal, previous_markdown, previous_html, illustration_images, cover
+    )
+
+
+async def _render_proposal(
+    proposal: str,
+    previous_markdown: str,
+    previous_html: str,
+    illustration_images: list[IllustrationImage],
+    cover: tuple[str, str, str, str],
+) -> SpeculativeRender:
+    html, markdown = await generate_manual_html_with_proposal(
+        previous_markdown, previous_html, proposal, illustration_images, *cover
+    )
+    pdf_bytes = await generate_manual_pdf(html)
+    return SpeculativeRender(html=html, markdown=markdown, pdf_bytes=pdf_bytes)
+
+
+def _speculate_proposal(session_id: str, session: dict, turn: dict[str, str]) -> None:
+    if turn["kind"] != "proposal":
+        return
+    inputs = session.get("inputs") or {}
+    step2 = inputs.get("step2") or {}
+    previous_markdown = inputs.get("markdown")
+    previous_html = inputs.get("html")
+    if (
+        not isinstance(step2, dict)
+        or not isinstance(previous_markdown, str)
+        or not previous_markdown.strip()
+        or not isinstance(previous_html, str)
+        or not previous_html.strip()
+    ):
+        return
+    proposal = turn["content"].strip()
+    illustration_images = _coerce_illustration_images(step2.get("illustration_images"))
+    cover = _manual_cover(inputs)
+    start_speculation(
+        session_id,
+        _proposal_render_key(
+            proposal, previous_markdown, previous_html, illustration_images, cover
+        ),
+        lambda: _render_proposal(
+            proposal, previous_markdown, previous_html, illustration_images, cover
+        ),
+    )
+
+
 @router.post("/agentic/start", response_model=AgenticConversationResponse)
-def agentic_start(request: AgenticStartRequest) -> AgenticConversationResponse:
-    session = get_session(request.session_id)
+async def agentic_start(
+    request: AgenticStartRequest,
+) -> AgenticConversationResponse:
+    session = await run_blocking(get_session, request.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     place = session.get("place") or {}
     if not place:
         raise HTTPException(status_code=400, detail="Place is required")
 
-    city = place.get("city")
-    prefecture = place.get("prefecture")
-    try:
-        search = search_official_manual(city, prefecture, place)
-    except RuntimeError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    prefetched = await prefetched_reference(request.session_id, session)
+    if prefetched is not None:
+        search = prefetched.get("search")
+    else:
+        city = place.get("city")
+        prefecture = place.get("prefecture")
+        try:
+            search = await find_official_manual(city, prefecture, place)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
 
+    cancel_speculation(request.session_id)
+    search, reference = await prepare_search_reference(request.session_id, search)
     context = _build_agentic_context(session)
     context["search"] = search or {}
     context["search_reference_text"] = (search or {}).get("reference_text") or ""
     history: list[dict[str, str]] = []
-    turn = build_agentic_turn(context, history)
+    previous_state = session.get("agentic") or {}
+    turn, context_cache = await build_agentic_turn(
+        context, history, reference, previous_state.get("context_cache")
+    )
     status = "question" if turn["kind"] == "question" else "proposal"
     history.append({"role": "assistant", "content": turn["content"]})
     agentic_state = {
@@ -77,15 +198,18 @@ def agentic_start(request: AgenticStartRequest) -> AgenticConversationResponse:
         "proposal": turn["content"] if turn["kind"] == "proposal" else None,
         "history": history,
         "search": search,
-        "search_reference_text": context.get("search_reference_text"),
+        "context_cache": context_cache,
     }
-    update_session(request.session_id, {"agentic": agentic_state})
+    await run_blocking(update_session, request.session_id, {"agentic": agentic_state})
+    _speculate_proposal(request.session_id, session, turn)
     return AgenticConversationResponse(agentic=agentic_state)
 
 
 @router.post("/agentic/respond", response_model=AgenticConversationResponse)
-def agentic_respond(request: AgenticRespondRequest) -> AgenticConversationResponse:
-    session = get_session(request.session_id)
+async def agentic_respond(
+    request: AgenticRespondRequest,
+) -> AgenticConversationResponse:
+    session = await run_blocking(get_session, request.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     agentic_state = session.get("agentic") or {}
@@ -96,13 +220,18 @@ def agentic_respond(request: AgenticRespondRequest) -> AgenticConversationRespon
     if not answer:
         raise HTTPException(status_code=400, detail="Answer is required")
 
+    cancel_speculation(request.session_id)
+    search_state, reference = await prepare_search_reference(
+        request.session_id, agentic_state.get("search")
+    )
     context = _build_agentic_context(session)
-    search_state = agentic_state.get("search") or {}
-    context["search"] = search_state
-    context["search_reference_text"] = search_state.get("reference_text") or ""
+    context["search"] = search_state or {}
+    context["search_reference_text"] = (search_state or {}).get("reference_text") or ""
     history = _coerce_history(agentic_state.get("history"))
     history.append({"role": "user", "content": answer})
-    turn = build_agentic_turn(context, history)
+    turn, context_cache = await build_agentic_turn(
+        context, history, reference, agentic_state.get("context_cache")
+    )
     status = "question" if turn["kind"] == "question" else "proposal"
     history.append({"role": "assistant", "content": turn["content"]})
     agentic_state = {
@@ -110,10 +239,11 @@ def agentic_respond(request: AgenticRespondRequest) -> AgenticConversationRespon
         "turn": turn,
         "proposal": turn["content"] if turn["kind"] == "proposal" else None,
         "history": history,
-        "search": agentic_state.get("search"),
-        "search_reference_text": context.get("search_reference_text"),
+        "search": search_state,
+        "context_cache": context_cache,
     }
-    update_session(request.session_id, {"agentic": agentic_state})
+    await run_blocking(update_session, request.session_id, {"agentic": agentic_state})
+    _speculate_proposal(request.session_id, session, turn)
     return AgenticConversationResponse(agentic=agentic_state)
 
 
@@ -121,7 +251,7 @@ def agentic_respond(request: AgenticRespondRequest) -> AgenticConversationRespon
 async def agentic_decision(
     request: AgenticDecisionRequest,
 ) -> AgenticDecisionResponse:
-    session = get_session(request.session_id)
+    session = await run_blocking(get_session, request.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     agentic_state = session.get("agentic") or {}
@@ -132,6 +262,7 @@ async def agentic_decision(
 
     decision = request.decision
     if decision == "no":
+        cancel_speculation(request.session_id)
         history.append({"role": "user", "content": "いいえ"})
         agentic_state.update(
             {
@@ -139,7 +270,9 @@ async def agentic_decision(
                 "history": history,
             }
         )
-        update_session(request.session_id, {"agentic": agentic_state})
+        await run_blocking(
+            update_session, request.session_id, {"agentic": agentic_state}
+        )
         return AgenticDecisionResponse(agentic=agentic_state)
 
     proposal = agentic_state.get("proposal")
@@ -147,7 +280,6 @@ async def agentic_decision(
         raise HTTPException(status_code=400, detail="Proposal is missing")
 
     inputs = session.get("inputs") or {}
-    step1 = inputs.get("step1") or {}
     step2 = inputs.get("step2") or {}
     if not isinstance(step2, dict):
         raise HTTPException(status_code=400, detail="Step2 data is missing")
@@ -173,6 +305,7 @@ async def agentic_decision(
                 "gcs_uri": item.get("gcs_uri"),
                 "filename": item.get("filename"),
                 "content_type": item.get("content_type"),
+                "original_gcs_uri": item.get("original_gcs_uri"),
             }
         )
     if not uploaded_images and raw_images:
@@ -184,58 +317,33 @@ async def agentic_decision(
         raise HTTPException(status_code=400, detail="Step2 markdown is missing")
     if not isinstance(previous_html, str) or not previous_html.strip():
         raise HTTPException(status_code=400, detail="Step2 html is missing")
-    previous_html = html_lib.unescape(previous_html)
 
-    name = ""
-    author = ""
-    issued_on = ""
-    if isinstance(step1, dict):
-        name = str(step1.get("name") or "").strip()
-        author = str(step1.get("author") or "").strip()
-    if isinstance(step2.get("issued_on"), str):
-        issued_on = step2.get("issued_on").strip()
-    if not issued_on:
-        issued_on = build_issued_on()
-    manual_title = f"{name} 防災マニュアル" if name else "防災マニュアル"
+    cover = _manual_cover(inputs)
+    manual_title, name, author, issued_on = cover
 
-    illustration_images: list[IllustrationImage] = []
-    raw_illustrations = step2.get("illustration_images")
-    if isinstance(raw_illustrations, list):
-        for item in raw_illustrations:
-            if not isinstance(item, dict):
-                continue
-            illustration_id = item.get("id")
-            public_url_value = item.get("public_url")
-            prompt_text = item.get("prompt")
-            if (
-                not isinstance(illustration_id, str)
-                or not isinstance(public_url_value, str)
-                or not isinstance(prompt_text, str)
-            ):
-                continue
-            illustration_images.append(
-                {
-                    "id": illustration_id,
-                    "prompt": prompt_text,
-                    "public_url": public_url_value,
-                    "gcs_uri": item.get("gcs_uri"),
-                    "content_type": item.get("content_type"),
-                    "alt": item.get("alt"),
-                }
-            )
-
-    html, markdown = generate_manual_html_with_proposal(
-        previous_markdown,
-        previous_html,
-        proposal.strip(),
+    illustration_images = _coerce_illustration_images(step2.get("illustration_images"))
+
+    key = _proposal_render_key(
+        proposal.strip(), previous_markdown, previous_html, illustration_images, cover
     )
-    pdf_bytes = await generate_manual_pdf(html)
+    rendered = await take_speculation(request.session_id, key)
+    if rendered is None:
+        rendered = await _render_proposal(
+            proposal.strip(),
+            previous_markdown,
+            previous_html,
+            illustration_images,
+            cover,
+        )
+    html, markdown, pdf_bytes = rendered.html, rendered.markdown, rendered.pdf_bytes
 
     settings = get_settings()
     if not settings.gcs_bucket:
         raise HTTPException(status_code=500, detail="GCS_BUCKET is not set")
     blob_name = f"sessions/{request.session_id}/output/manual.pdf"
-    upload_bytes(settings.gcs_bucket, blob_name, pdf_bytes, "application/pdf")
+    await run_blocking(
+        upload_bytes, settings.gcs_bucket, blob_name, pdf_bytes, "application/pdf"
+    )
 
     history.append({"role": "user", "content": "はい"})
     agentic_state.update(
@@ -244,7 +352,8 @@ async def agentic_decision(
             "history": history,
         }
     )
-    update_session(
+    await run_blocking(
+        update_session,
         request.session_id,
         {
             "status": "done",
@@ -1,32 +1,63 @@
+import asyncio
+import json
 import os
+from collections.abc import AsyncIterator
 
 from fastapi import APIRouter, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import FormData
 from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException
 
 from app.core.config import get_settings
-from app.schemas.manual import GenerateResponse, IllustrationImage, InputImage
-from app.services.generate import (
-    generate_manual_html_from_markdown,
-    generate_manual_pdf,
-    generate_markdown_with_prompts,
-)
-from app.services.nanobanana import generate_illustration
-from app.services.sessions import get_session, update_session
-from app.services.storage import public_url, upload_bytes
-from app.utils.dates import build_issued_on
+from app.schemas.manual import GenerateJobResponse, GenerateResponse, InputImage
+from app.services.images import optimize_image, optimized_filename
+from app.services.jobs import is_job_running, start_generation_job
+from app.services.pipeline import run_generation
+from app.services.renderer import RenderAsset
+from app.services.sessions import get_session
+from app.services.storage import public_url, upload_bytes, upload_file
+from app.utils.concurrency import run_blocking
+from app.utils.uploads import UploadTooLargeError, parse_limited_multipart
 
 router = APIRouter()
 
+_JOB_EVENTS_INTERVAL_SECONDS = 1.0
+_JOB_FINAL_STATUSES = {"done", "failed"}
+
 
 def _is_upload_file(value: object) -> bool:
     return isinstance(value, StarletteUploadFile)
 
 
-@router.post("/generate", response_model=GenerateResponse)
-async def generate(
-    request: Request,
-) -> GenerateResponse:
-    form = await request.form()
+async def _read_form(request: Request) -> FormData:
+    settings = get_settings()
+    content_length = request.headers.get("content-length")
+    if (
+        content_length
+        and content_length.isdigit()
+        and int(content_length) > settings.upload_max_request_bytes
+    ):
+        raise HTTPException(status_code=413, detail="Request body is too large")
+    content_type = request.headers.get("content-type") or ""
+    if not content_type.startswith("multipart/form-data"):
+        return await request.form()
+    try:
+        return await parse_limited_multipart(
+            request.headers,
+            request.stream(),
+            settings.upload_max_file_bytes,
+            settings.upload_max_request_bytes,
+        )
+    except UploadTooLargeError as exc:
+        raise HTTPException(status_code=413, detail=exc.message) from exc
+    except MultiPartException as exc:
+        raise HTTPException(status_code=400, detail=exc.message) from exc
+
+
+def _read_generate_form(
+    form: FormData,
+) -> tuple[str, str, list[UploadFile], list[str]]:
     memo = (form.get("memo") or "").strip()
     session_id = form.get("session_id")
     if not isinstance(session_id, str) or not session_id:
@@ -44,107 +75,175 @@ async def generate(
 
     if not memo and not image_list:
         raise HTTPException(status_code=400, detail="memo or images are required")
-
-    session = get_session(session_id)
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    settings = get_settings()
-    if not settings.gcs_bucket:
-        raise HTTPException(status_code=500, detail="GCS_BUCKET is not set")
-
     if image_list and len(descriptions) != len(image_list):
         raise HTTPException(
             status_code=400, detail="image_descriptions length mismatch"
         )
-
-    uploaded_images: list[InputImage] = []
-    for index, image in enumerate(image_list):
-        description = (descriptions[index] or "").strip()
-        if not description:
+    for description in descriptions:
+        if not description.strip():
             raise HTTPException(status_code=400, detail="image description is required")
-        file_bytes = await image.read()
-        filename = os.path.basename(image.filename or f"input-{index + 1}.png")
-        content_type = image.content_type or "application/octet-stream"
-        blob_name = f"sessions/{session_id}/input/images/{index + 1}-{filename}"
-        gcs_uri = upload_bytes(settings.gcs_bucket, blob_name, file_bytes, content_type)
-        uploaded_images.append(
-            {
-                "description": description,
-                "public_url": public_url(settings.gcs_bucket, blob_name),
-                "gcs_uri": gcs_uri,
-                "filename": filename,
-                "content_type": content_type,
-            }
-        )
+    return session_id, memo, image_list, descriptions
 
-    inputs = session.get("inputs") or {}
-    step1 = inputs.get("step1") or {}
-    name = ""
-    author = ""
-    if isinstance(step1, dict):
-        name = str(step1.get("name") or "").strip()
-        author = str(step1.get("author") or "").strip()
-    manual_title = f"{name} 防災マニュアル" if name else "防災マニュアル"
-
-    issued_on = build_issued_on()
-    markdown, illustration_prompts = generate_markdown_with_prompts(
-        memo,
-        uploaded_images,
-        manual_title,
-        name,
-        author,
-        issued_on,
-    )
 
-    illustration_images: list[IllustrationImage] = []
-    for index, prompt in enumerate(illustration_prompts, start=1):
-        image_bytes, content_type = generate_illustration(prompt["prompt"])
-        illustration_id = prompt["id"]
+def _store_input_image(
+    session_id: str,
+    bucket: str,
+    index: int,
+    image: UploadFile,
+    description: str,
+) -> tuple[InputImage, RenderAsset]:
+    settings = get_settings()
+    filename = os.path.basename(image.filename or f"input-{index + 1}.png")
+    content_type = image.content_type or "application/octet-stream"
+    blob_name = f"sessions/{session_id}/input/images/{index + 1}-{filename}"
+    original_gcs_uri = upload_file(
+        bucket, blob_name, image.file, content_type, settings.upload_chunk_bytes
+    )
+    optimized = optimize_image(image.file)
+    if optimized is None:
+        image.file.seek(0)
+        asset = (image.file.read(), content_type)
+        gcs_uri = original_gcs_uri
+    else:
+        asset = optimized
+        content_type = optimized[1]
         blob_name = (
-            f"sessions/{session_id}/output/illustrations/{illustration_id}-{index}.png"
-        )
-        gcs_uri = upload_bytes(
-            settings.gcs_bucket, blob_name, image_bytes, content_type
-        )
-        illustration_images.append(
-            {
-                "id": illustration_id,
-                "prompt": prompt["prompt"],
-                "public_url": public_url(settings.gcs_bucket, blob_name),
-                "gcs_uri": gcs_uri,
-                "content_type": content_type,
-                "alt": prompt.get("alt"),
-            }
+            f"sessions/{session_id}/input/images/optimized/"
+            f"{index + 1}-{optimized_filename(filename, content_type)}"
         )
+        gcs_uri = upload_bytes(bucket, blob_name, optimized[0], content_type)
+    return (
+        {
+            "description": description.strip(),
+            "public_url": public_url(bucket, blob_name),
+            "gcs_uri": gcs_uri,
+            "filename": filename,
+            "content_type": content_type,
+            "original_gcs_uri": original_gcs_uri,
+        },
+        asset,
+    )
 
-    html, markdown = generate_manual_html_from_markdown(
-        markdown, uploaded_images, illustration_images
+
+async def _upload_input_images(
+    session_id: str,
+    bucket: str,
+    image_list: list[UploadFile],
+    descriptions: list[str],
+) -> tuple[list[InputImage], dict[str, RenderAsset]]:
+    results = await asyncio.gather(
+        *(
+            run_blocking(
+                _store_input_image,
+                session_id,
+                bucket,
+                index,
+                image,
+                descriptions[index],
+            )
+            for index, image in enumerate(image_list)
+        )
     )
-    pdf_bytes = await generate_manual_pdf(html)
+    uploaded_images = [uploaded_image for uploaded_image, _ in results]
+    render_assets = {
+        uploaded_image["public_url"]: asset for uploaded_image, asset in results
+    }
+    return uploaded_images, render_assets
 
-    blob_name = f"sessions/{session_id}/output/manual.pdf"
-    upload_bytes(settings.gcs_bucket, blob_name, pdf_bytes, "application/pdf")
-    update_session(
-        session_id,
-        {
-            "status": "done",
-            "pdf_blob_name": blob_name,
-            "inputs": {
-                "step2": {
-                    "memo": memo,
-                    "manual_title": manual_title,
-                    "name": name,
-                    "author": author,
-                    "issued_on": issued_on,
-                    "uploaded_images": uploaded_images,
-                    "illustration_prompts": illustration_prompts,
-                    "illustration_images": illustration_images,
-                },
-                "html": html,
-                "markdown": markdown,
-            },
-        },
+
+def _require_bucket() -> str:
+    settings = get_settings()
+    if not settings.gcs_bucket:
+        raise HTTPException(status_code=500, detail="GCS_BUCKET is not set")
+    return settings.gcs_bucket
+
+
+@router.post("/generate", response_model=GenerateResponse)
+async def generate(
+    request: Request,
+) -> GenerateResponse:
+    form = await _read_form(request)
+    try:
+        session_id, memo, image_list, descriptions = _read_generate_form(form)
+        session = await run_blocking(get_session, session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        bucket = _require_bucket()
+
+        uploaded_images, render_assets = await _upload_input_images(
+            session_id, bucket, image_list, descriptions
+        )
+    finally:
+        await form.close()
+    await run_generation(
+        session_id, session, bucket, memo, uploaded_images, render_assets
     )
-    session_payload = get_session(session_id)
+    session_payload = await run_blocking(get_session, session_id)
     return GenerateResponse(session=session_payload)
+
+
+@router.post("/generate/jobs", response_model=GenerateJobResponse)
+async def create_generate_job(request: Request) -> GenerateJobResponse:
+    form = await _read_form(request)
+    try:
+        session_id, memo, image_list, descriptions = _read_generate_form(form)
+        session = await run_blocking(get_session, session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if is_job_running(session_id) and session.get("job"):
+            return GenerateJobResponse(job=session["job"])
+        bucket = _require_bucket()
+
+        uploaded_images, render_assets = await _upload_input_images(
+            session_id, bucket, image_list, descriptions
+        )
+    finally:
+        await form.close()
+    job = await start_generation_job(
+        session_id, session, bucket, memo, uploaded_images, render_assets
+    )
+    return GenerateJobResponse(job=job)
+
+
+async def _get_job(session_id: str) -> dict:
+    session = await run_blocking(get_session, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    job = session.get("job")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/generate/jobs/{session_id}", response_model=GenerateJobResponse)
+async def get_generate_job(session_id: str) -> GenerateJobResponse:
+    return GenerateJobResponse(job=await _get_job(session_id))
+
+
+@router.get("/generate/jobs/{session_id}/events")
+async def stream_generate_job(session_id: str) -> StreamingResponse:
+    job = await _get_job(session_id)
+
+    async def _events() -> AsyncIterator[str]:
+        current = job
+        last_payload = None
+        while True:
+            payload = json.dumps(current, ensure_ascii=False)
+            if payload != last_payload:
+                yield f"event: progress\ndata: {payload}\n\n"
+                last_payload = payload
+            else:
+                yield ": keep-alive\n\n"
+            if current.get("status") in _JOB_FINAL_STATUSES:
+                return
+            await asyncio.sleep(_JOB_EVENTS_INTERVAL_SECONDS)
+            # The response has already started, so failures become an event.
+            try:
+                current = await _get_job(session_id)
+            except HTTPException as exc:
+                payload = json.dumps({"detail": exc.detail}, ensure_ascii=False)
+                yield f"event: error\ndata: {payload}\n\n"
+                return
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_events(), media_type="text/event-stream", headers=headers)
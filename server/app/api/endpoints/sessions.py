@@ -11,6 +11,10 @@ from app.schemas.session import (
     SessionDetailResponse,
     SessionsResponse,
 )
+from app.services.reference_prefetch import (
+    cancel_reference_prefetch,
+    start_reference_prefetch,
+)
 from app.services.sessions import (
     create_session,
     delete_session,
@@ -19,6 +23,7 @@ from app.services.sessions import (
     list_sessions,
 )
 from app.services.storage import delete_prefix
+from app.utils.concurrency import run_blocking
 
 router = APIRouter()
 
@@ -37,19 +42,24 @@ def session_detail(session_id: str) -> SessionDetailResponse:
 
 
 @router.post("/sessions", response_model=SessionDetailResponse)
-def create_session_entry(request: SessionCreateRequest) -> SessionDetailResponse:
+async def create_session_entry(request: SessionCreateRequest) -> SessionDetailResponse:
     if not request.place or not request.place.place_id:
         raise HTTPException(status_code=400, detail="place is required")
     name = (request.name or "").strip()
     author = (request.author or "").strip()
-    session_id = create_session(
-        {
-            "status": "step2",
-            "place": request.place.model_dump(),
-            "inputs": {"step1": {"name": name, "author": author}},
-        }
-    )
-    session = get_session(session_id)
+    place = request.place.model_dump()
+    prefetch = bool(place.get("city") or place.get("prefecture"))
+    payload = {
+        "status": "step2",
+        "place": place,
+        "inputs": {"step1": {"name": name, "author": author}},
+    }
+    if prefetch:
+        payload["reference"] = {"status": "pending"}
+    session_id = await run_blocking(create_session, payload)
+    if prefetch:
+        start_reference_prefetch(session_id, place)
+    session = await run_blocking(get_session, session_id)
     return SessionDetailResponse(session=session)
 
 
@@ -78,11 +88,14 @@ def download_session_pdf(session_id: str) -> StreamingResponse:
 
 
 @router.delete("/sessions/{session_id}", status_code=204)
-def delete_session_entry(session_id: str) -> None:
-    session = get_session(session_id)
+async def delete_session_entry(session_id: str) -> None:
+    session = await run_blocking(get_session, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    cancel_reference_prefetch(session_id)
     settings = get_settings()
     if settings.gcs_bucket:
-        delete_prefix(settings.gcs_bucket, f"sessions/{session_id}/")
-    delete_session(session_id)
+        await run_blocking(
+            delete_prefix, settings.gcs_bucket, f"sessions/{session_id}/"
+        )
+    await run_blocking(delete_session, session_id)
@@ -0,0 +1,54 @@
+import argparse
+import logging
+
+from app.core.config import get_settings
+from app.services.illustration_catalog import (
+    CatalogEntry,
+    archive_entry,
+    collect_session_illustrations,
+    load_catalog_entries,
+    merge_entries,
+    save_catalog_entries,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _archive_entries(bucket: str, entries: list[CatalogEntry]) -> list[CatalogEntry]:
+    archived: list[CatalogEntry] = []
+    for entry in entries:
+        stored = archive_entry(bucket, entry)
+        if stored is None:
+            logger.warning("Skipping illustration %s", entry["public_url"])
+            continue
+        archived.append(stored)
+    return archived
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build the stock illustration catalog from past sessions."
+    )
+    parser.add_argument("command", choices=["seed", "rebuild"])
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    bucket = get_settings().gcs_bucket
+    if not bucket:
+        raise SystemExit("GCS_BUCKET is not configured")
+
+    existing = load_catalog_entries(bucket) if args.command == "seed" else []
+    known = {entry["public_url"] for entry in existing}
+    incoming = [
+        entry
+        for entry in collect_session_illustrations(args.limit)
+        if entry["public_url"] not in known
+    ]
+    entries = merge_entries(existing, _archive_entries(bucket, incoming))
+    save_catalog_entries(bucket, entries)
+    logger.info("Illustration catalog saved with %d entries", len(entries))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,211 @@ import os
 from dataclasses import dataclass
 
 
+@dataclass(frozen=True)
+class LLMProfile:
+    model: str
+    temperature: float
+    max_output_tokens: int
+
+
 @dataclass(frozen=True)
 class Settings:
     gemini_api_key: str | None
     gemini_model: str
+    gemini_fast_model: str
     nanobanana_model: str
     google_api_key: str | None
     google_search_cx: str | None
     gcp_project: str | None
     gcs_bucket: str | None
     gcs_output_prefix: str
+    renderer_pool_size: int
+    blocking_io_workers: int
+    illustration_concurrency: int
+    illustration_timeout_seconds: float
+    illustration_cache_enabled: bool
+    illustration_cache_max_entries: int
+    illustration_catalog_enabled: bool
+    illustration_catalog_threshold: float
+    illustration_catalog_refresh_seconds: float
+    image_print_dpi: int
+    image_jpeg_quality: int
+    upload_max_file_bytes: int
+    upload_max_request_bytes: int
+    upload_chunk_bytes: int
+    llm_cache_backend: str
+    llm_cache_path: str
+    llm_cache_ttl_seconds: float
+    llm_cache_max_entries: int
+    llm_cache_bypass: bool
+    llm_stage_deadlines: dict[str, float]
+    llm_default_deadline_seconds: float
+    llm_hedge_enabled: bool
+    llm_hedge_percentile: float
+    llm_hedge_min_samples: int
+    llm_hedge_initial_delay_seconds: float
+    llm_max_retries: int
+    llm_retry_base_seconds: float
+    llm_retry_max_seconds: float
+    llm_profiles: dict[str, LLMProfile]
+    agentic_history_window: int
+    agentic_prompt_budgets: dict[str, float]
+    agentic_reference_top_k: int
+    reference_chunk_chars: int
+    reference_chunk_overlap_chars: int
+    context_cache_provider: str
+    context_cache_ttl_seconds: int
+    context_cache_min_tokens: int
+    speculation_enabled: bool
+    speculation_max_concurrency: int
+    speculation_ttl_seconds: float
+    speculation_max_settled: int
+    reference_cache_ttl_seconds: int
+    reference_cache_negative_ttl_seconds: int
+    search_confident_score: int
+    pdf_text_min_chars: int
+    pdf_text_min_readable_ratio: float
+    ocr_max_pages: int
+    ocr_batch_size: int
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_float_map(name: str, default: str) -> dict[str, float]:
+    values: dict[str, float] = {}
+    for item in (os.getenv(name) or default).split(","):
+        key, _, value = item.partition("=")
+        if key.strip() and value.strip():
+            values[key.strip()] = float(value)
+    return values
+
+
+def _llm_profile(
+    name: str, model: str, temperature: float, max_output_tokens: int
+) -> LLMProfile:
+    prefix = f"LLM_PROFILE_{name.upper()}"
+    return LLMProfile(
+        model=os.getenv(f"{prefix}_MODEL", model),
+        temperature=float(os.getenv(f"{prefix}_TEMPERATURE", str(temperature))),
+        max_output_tokens=int(
+            os.getenv(f"{prefix}_MAX_OUTPUT_TOKENS", str(max_output_tokens))
+        ),
+    )
+
+
+def _llm_profiles(model: str, fast_model: str) -> dict[str, LLMProfile]:
+    return {
+        "agentic_question": _llm_profile("agentic_question", fast_model, 0.3, 1024),
+        # Profiles on the thinking model leave room for reasoning tokens, which
+        # count toward max_output_tokens.
+        "agentic_proposal": _llm_profile("agentic_proposal", model, 0.3, 8192),
+        "markdown": _llm_profile("markdown", model, 0.3, 32768),
+        "markdown_revision": _llm_profile("markdown_revision", model, 0.2, 32768),
+        "html_patch": _llm_profile("html_patch", model, 0.2, 16384),
+    }
+
+
+# GCS resumable uploads require chunk sizes in multiples of 256 KiB.
+_GCS_CHUNK_MULTIPLE = 256 * 1024
+
+
+def _chunk_size(value: int) -> int:
+    return max(value // _GCS_CHUNK_MULTIPLE, 1) * _GCS_CHUNK_MULTIPLE
 
 
 def get_settings() -> Settings:
+    gemini_model = os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
+    gemini_fast_model = os.getenv("GEMINI_FAST_MODEL", "gemini-2.5-flash-lite")
     return Settings(
         gemini_api_key=os.getenv("GEMINI_API_KEY"),
-        gemini_model=os.getenv("GEMINI_MODEL", "gemini-3-flash-preview"),
+        gemini_model=gemini_model,
+        gemini_fast_model=gemini_fast_model,
         nanobanana_model=os.getenv("NANOBANANA_MODEL", "gemini-2.5-flash-image"),
         google_api_key=os.getenv("GOOGLE_API_KEY"),
         google_search_cx=os.getenv("GOOGLE_SEARCH_CX"),
         gcp_project=os.getenv("GCP_PROJECT"),
         gcs_bucket=os.getenv("GCS_BUCKET"),
         gcs_output_prefix=os.getenv("GCS_OUTPUT_PREFIX", "vision-output/"),
+        renderer_pool_size=int(os.getenv("RENDERER_POOL_SIZE", "2")),
+        blocking_io_workers=int(os.getenv("BLOCKING_IO_WORKERS", "16")),
+        illustration_concurrency=int(os.getenv("ILLUSTRATION_CONCURRENCY", "3")),
+        illustration_timeout_seconds=float(
+            os.getenv("ILLUSTRATION_TIMEOUT_SECONDS", "90")
+        ),
+        illustration_cache_enabled=_env_flag("ILLUSTRATION_CACHE_ENABLED", True),
+        illustration_cache_max_entries=int(
+            os.getenv("ILLUSTRATION_CACHE_MAX_ENTRIES", "512")
+        ),
+        illustration_catalog_enabled=_env_flag("ILLUSTRATION_CATALOG_ENABLED", True),
+        illustration_catalog_threshold=float(
+            os.getenv("ILLUSTRATION_CATALOG_THRESHOLD", "0.7")
+        ),
+        illustration_catalog_refresh_seconds=float(
+            os.getenv("ILLUSTRATION_CATALOG_REFRESH_SECONDS", "3600")
+        ),
+        image_print_dpi=int(os.getenv("IMAGE_PRINT_DPI", "200")),
+        image_jpeg_quality=int(os.getenv("IMAGE_JPEG_QUALITY", "85")),
+        upload_max_file_bytes=int(os.getenv("UPLOAD_MAX_FILE_BYTES", "20971520")),
+        upload_max_request_bytes=int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", "62914560")),
+        upload_chunk_bytes=_chunk_size(int(os.getenv("UPLOAD_CHUNK_BYTES", "8388608"))),
+        llm_cache_backend=os.getenv("LLM_CACHE_BACKEND", "memory").strip().lower(),
+        llm_cache_path=os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3"),
+        llm_cache_ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+        llm_cache_max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+        llm_cache_bypass=_env_flag("LLM_CACHE_BYPASS", False),
+        llm_stage_deadlines=_env_float_map(
+            "LLM_STAGE_DEADLINES",
+            "markdown=240,markdown_revision=180,html_patch=120,agentic_question=30,agentic_proposal=60",
+        ),
+        llm_default_deadline_seconds=float(
+            os.getenv("LLM_DEFAULT_DEADLINE_SECONDS", "120")
+        ),
+        llm_hedge_enabled=_env_flag("LLM_HEDGE_ENABLED", True),
+        llm_hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+        llm_hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10")),
+        llm_hedge_initial_delay_seconds=float(
+            os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", "60")
+        ),
+        llm_max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        llm_retry_base_seconds=float(os.getenv("LLM_RETRY_BASE_SECONDS", "1")),
+        llm_retry_max_seconds=float(os.getenv("LLM_RETRY_MAX_SECONDS", "8")),
+        llm_profiles=_llm_profiles(gemini_model, gemini_fast_model),
+        agentic_history_window=int(os.getenv("AGENTIC_HISTORY_WINDOW", "8")),
+        agentic_prompt_budgets=_env_float_map(
+            "AGENTIC_PROMPT_BUDGETS",
+            "place=300,answers=1500,generated_markdown=6000,"
+            "search_reference_text=4000,history=2000",
+        ),
+        agentic_reference_top_k=int(os.getenv("AGENTIC_REFERENCE_TOP_K", "4")),
+        reference_chunk_chars=int(os.getenv("REFERENCE_CHUNK_CHARS", "500")),
+        reference_chunk_overlap_chars=int(
+            os.getenv("REFERENCE_CHUNK_OVERLAP_CHARS", "100")
+        ),
+        context_cache_provider=os.getenv("CONTEXT_CACHE_PROVIDER", "gemini")
+        .strip()
+        .lower(),
+        context_cache_ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "1800")),
+        context_cache_min_tokens=int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096")),
+        speculation_enabled=_env_flag("SPECULATION_ENABLED", True),
+        speculation_max_concurrency=int(os.getenv("SPECULATION_MAX_CONCURRENCY", "2")),
+        speculation_ttl_seconds=float(os.getenv("SPECULATION_TTL_SECONDS", "600")),
+        speculation_max_settled=int(os.getenv("SPECULATION_MAX_SETTLED", "16")),
+        reference_cache_ttl_seconds=int(
+            os.getenv("REFERENCE_CACHE_TTL_SECONDS", str(30 * 24 * 3600))
+        ),
+        reference_cache_negative_ttl_seconds=int(
+            os.getenv("REFERENCE_CACHE_NEGATIVE_TTL_SECONDS", "3600")
+        ),
+        search_confident_score=int(os.getenv("SEARCH_CONFIDENT_SCORE", "25")),
+        pdf_text_min_chars=int(os.getenv("PDF_TEXT_MIN_CHARS", "40")),
+        pdf_text_min_readable_ratio=float(
+            os.getenv("PDF_TEXT_MIN_READABLE_RATIO", "0.9")
+        ),
+        ocr_max_pages=int(os.getenv("OCR_MAX_PAGES", "20")),
+        ocr_batch_size=int(os.getenv("OCR_BATCH_SIZE", "5")),
     )
@@ -1,9 +1,32 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.router import api_router
+from app.services.illustration_cache import illustration_cache_stats
+from app.services.llm import llm_cache_stats, llm_call_stats
+from app.services.reference_cache import reference_cache_stats
+from app.services.renderer import get_renderer
+from app.services.search import close_http_client
+from app.services.speculation import speculation_stats
+from app.utils.concurrency import shutdown_executor
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    renderer = get_renderer()
+    await renderer.start()
+    try:
+        yield
+    finally:
+        await renderer.stop()
+        await close_http_client()
+        shutdown_executor()
+
 
-app = FastAPI(title="Server API")
+app = FastAPI(title="Server API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,4 +41,11 @@ app.include_router(api_router, prefix="/api")
 
 @app.get("/health")
 def health_check() -> dict:
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "illustration_cache": illustration_cache_stats(),
+        "llm_cache": llm_cache_stats(),
+        "llm_calls": llm_call_stats(),
+        "speculation": speculation_stats(),
+        "reference_cache": reference_cache_stats(),
+    }
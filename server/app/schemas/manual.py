@@ -2,7 +2,7 @@ from typing import TypedDict
 
 from pydantic import BaseModel
 
-from app.schemas.session import SessionDetail
+from app.schemas.session import GenerationJob, SessionDetail
 
 
 class InputImage(TypedDict):
@@ -11,6 +11,7 @@ class InputImage(TypedDict):
     gcs_uri: str | None
     filename: str | None
     content_type: str | None
+    original_gcs_uri: str | None
 
 
 class IllustrationPrompt(TypedDict):
@@ -30,3 +31,7 @@ class IllustrationImage(TypedDict):
 
 class GenerateResponse(BaseModel):
     session: SessionDetail | None = None
+
+
+class GenerateJobResponse(BaseModel):
+    job: GenerationJob
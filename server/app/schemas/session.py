@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import BaseModel
 
@@ -6,6 +6,15 @@ from app.schemas.agentic import AgenticState
 from app.schemas.place import PlaceDetail
 
 
+class GenerationJob(BaseModel):
+    id: str
+    session_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    stage: str | None = None
+    error: str | None = None
+    preview_markdown: str | None = None
+
+
 class SessionSummary(BaseModel):
     id: str
     place: PlaceDetail | None = None
@@ -27,6 +36,7 @@ class SessionDetail(BaseModel):
     updated_at: str | None = None
     inputs: dict[str, Any] | None = None
     agentic: AgenticState | None = None
+    job: GenerationJob | None = None
 
 
 class SessionCreateRequest(BaseModel):
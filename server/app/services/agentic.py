@@ -1,12 +1,43 @@
-import json
+import logging
 from typing import Any
 
-from langchain_core.messages import HumanMessage
+from app.core.config import get_settings
+from app.services.context_cache import generate_with_context_cache
+from app.services.manual_html import split_markdown_sections
+from app.services.reference_index import ReferenceIndex
+from app.utils.parsing import is_json_response, parse_json_response
+from app.utils.prompt_budget import compact_json, estimate_tokens, truncate_to_tokens
 
-from app.services.llm import get_llm
-from app.utils.parsing import parse_json_response
+logger = logging.getLogger(__name__)
 
 _ALLOWED_TURN_KINDS = {"question", "proposal"}
+# Mirrors rule 2 of the prompt: after this many questions the agent must propose.
+_MAX_QUESTION_TURNS = 2
+
+_AGENTIC_INSTRUCTIONS = (
+    "あなたはマンション用の防災マニュアルの改定を支援する対話型エージェントです。"
+    "次のルールを厳守してください:"
+    "1) 返答は1ターンのみで、質問か提案のどちらか一方。"
+    "2) 会話開始時（履歴が空）は必ず質問で始める。"
+    "   質問は具体的な不足情報を1〜3問だけ列挙する。"
+    "   質問は最大2ターンまでとし、3回目以降は必ず提案に切り替える。"
+    "3) 質問は広い問いではなく、避難経路の地名/ルート、連絡先の番号と役割、"
+    "   備蓄品の種類と数量、要支援者サポート体制などの具体情報を尋ねる。"
+    "4) ユーザーの直近の回答が曖昧・不足している場合は、追加の質問。"
+    "   質問は1ターンに1〜3問まで列挙してよい。"
+    "5) 情報が十分に揃ったと判断できるときだけ、具体的な改定提案を1つ提示。"
+    "6) 提案は2〜4文の短い段落で、箇条書きは使わない。"
+    "7) 余計な説明やメタ情報は不要。"
+    "8) 以下のテキストを参考に、足りない箇所や改善が必要な箇所にフォーカスすること:"
+    "   context.search_reference_text は公式マニュアル"
+    "PDFのテキスト（関連箇所の抜粋の場合がある）。"
+    "   context.generated_markdown は現在の生成マニュアルの"
+    "Markdown本文。"
+    "context.search_reference_text と history は INPUT(JSON) に含まれる。"
+    "history_omitted がある場合は、それだけ古い発言が省略されている。"
+    "出力は必ずJSONのみで次の形式にしてください:\n"
+    '{"kind": "question" | "proposal", "content": "..."}\n'
+)
 
 
 def _coerce_turn(payload: dict[str, Any] | None) -> dict[str, str] | None:
@@ -21,59 +52,155 @@ def _coerce_turn(payload: dict[str, Any] | None) -> dict[str, str] | None:
     return {"kind": kind, "content": content.strip()}
 
 
-def _build_agentic_prompt(
+def _compact_place(place: dict[str, Any]) -> dict[str, Any]:
+    keys = ("name", "formatted_address", "prefecture", "city")
+    return {key: place[key] for key in keys if place.get(key)}
+
+
+def _compact_answers(answers: dict[str, Any], budget: int) -> dict[str, Any]:
+    compact: dict[str, Any] = {}
+    memo = answers.get("memo")
+    if isinstance(memo, str) and memo.strip():
+        compact["memo"] = truncate_to_tokens(memo.strip(), budget)
+    descriptions = [
+        item.get("description")
+        for item in answers.get("uploaded_images") or []
+        if isinstance(item, dict) and item.get("description")
+    ]
+    if descriptions:
+        compact["image_descriptions"] = descriptions
+    return compact
+
+
+def _compact_search(search: dict[str, Any]) -> dict[str, Any]:
+    result = search.get("result") or {}
+    compact = {"scope": search.get("scope"), "title": result.get("title")}
+    return {key: value for key, value in compact.items() if value}
+
+
+def _window_history(
+    history: list[dict[str, str]], window: int, budget: int
+) -> tuple[list[dict[str, str]], int]:
+    kept: list[dict[str, str]] = []
+    used = 0
+    for item in reversed(history[-window:] if window > 0 else []):
+        cost = estimate_tokens(item["content"])
+        if kept and used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    kept.reverse()
+    return kept, len(history) - len(kept)
+
+
+def _budget_context(context: dict[str, Any]) -> dict[str, Any]:
+    budgets = get_settings().agentic_prompt_budgets
+    place = context.get("place") or {}
+    answers = context.get("answers") or {}
+    search = context.get("search") or {}
+    compact = {
+        "place": _compact_place(place) if isinstance(place, dict) else {},
+        "answers": (
+            _compact_answers(answers, int(budgets.get("answers", 0)))
+            if isinstance(answers, dict)
+            else {}
+        ),
+        "search": _compact_search(search) if isinstance(search, dict) else {},
+        "generated_markdown": truncate_to_tokens(
+            context.get("generated_markdown") or "",
+            int(budgets.get("generated_markdown", 0)),
+        ),
+    }
+    return {key: value for key, value in compact.items() if value}
+
+
+def _build_agentic_prefix(stable: dict[str, Any]) -> str:
+    return _AGENTIC_INSTRUCTIONS + f"CONTEXT(JSON):\n{compact_json(stable)}\n"
+
+
+def _agentic_input(
     context: dict[str, Any], history: list[dict[str, str]]
-) -> str:
-    instructions = (
-        "あなたはマンション用の防災マニュアルの改定を支援する対話型エージェントです。"
-        "次のルールを厳守してください:"
-        "1) 返答は1ターンのみで、質問か提案のどちらか一方。"
-        "2) 会話開始時（履歴が空）は必ず質問で始める。"
-        "   質問は具体的な不足情報を1〜3問だけ列挙する。"
-        "   質問は最大2ターンまでとし、3回目以降は必ず提案に切り替える。"
-        "3) 質問は広い問いではなく、避難経路の地名/ルート、連絡先の番号と役割、"
-        "   備蓄品の種類と数量、要支援者サポート体制などの具体情報を尋ねる。"
-        "4) ユーザーの直近の回答が曖昧・不足している場合は、追加の質問。"
-        "   質問は1ターンに1〜3問まで列挙してよい。"
-        "5) 情報が十分に揃ったと判断できるときだけ、具体的な改定提案を1つ提示。"
-        "6) 提案は2〜4文の短い段落で、箇条書きは使わない。"
-        "7) 余計な説明やメタ情報は不要。"
-        "8) 以下のテキストを参考に、足りない箇所や改善が必要な箇所にフォーカスすること:"
-        "   context.search_reference_text は公式マニュアル"
-        "PDFのテキスト。"
-        "   context.generated_markdown は現在の生成マニュアルの"
-        "Markdown本文。"
-        "出力は必ずJSONのみで次の形式にしてください:\n"
-        '{"kind": "question" | "proposal", "content": "..."}\n'
+) -> dict[str, Any]:
+    settings = get_settings()
+    budgets = settings.agentic_prompt_budgets
+    windowed, omitted = _window_history(
+        history,
+        settings.agentic_history_window,
+        int(budgets.get("history", 0)),
     )
-    payload = {
-        "context": context,
-        "history": history,
-    }
-    return (
-        instructions
-        + f"INPUT(JSON):\n{json.dumps(payload, ensure_ascii=False, indent=2)}"
+    payload: dict[str, Any] = {}
+    reference_text = truncate_to_tokens(
+        context.get("search_reference_text") or "",
+        int(budgets.get("search_reference_text", 0)),
     )
+    if reference_text:
+        payload["search_reference_text"] = reference_text
+    payload["history"] = windowed
+    if omitted:
+        payload["history_omitted"] = omitted
+    return payload
 
 
-def build_agentic_turn(
-    context: dict[str, Any], history: list[dict[str, str]]
-) -> dict[str, str]:
-    prompt = _build_agentic_prompt(context, history)
+def _build_agentic_delta(payload: dict[str, Any]) -> str:
+    return f"INPUT(JSON):\n{compact_json(payload)}"
+
+
+def _reference_excerpts(
+    reference: ReferenceIndex, context: dict[str, Any], history: list[dict[str, str]]
+) -> str:
+    query = " ".join(item["content"] for item in history[-2:])
+    covered = split_markdown_sections(context.get("generated_markdown") or "")
+    excerpts = reference.select(query, covered, get_settings().agentic_reference_top_k)
+    return "\n---\n".join(excerpts)
+
+
+async def build_agentic_turn(
+    context: dict[str, Any],
+    history: list[dict[str, str]],
+    reference: ReferenceIndex | None = None,
+    context_cache: dict[str, Any] | None = None,
+) -> tuple[dict[str, str], dict[str, Any] | None]:
+    if reference is not None:
+        context = {
+            **context,
+            "search_reference_text": _reference_excerpts(reference, context, history),
+        }
+    stable = _budget_context(context)
+    payload = _agentic_input(context, history)
+    prefix = _build_agentic_prefix(stable)
+    delta = _build_agentic_delta(payload)
+    logger.info(
+        "Agentic prompt: prefix ~%d tokens, delta ~%d tokens (%s)",
+        estimate_tokens(prefix),
+        estimate_tokens(delta),
+        ", ".join(
+            f"{key}={estimate_tokens(compact_json(value))}"
+            for key, value in [*stable.items(), *payload.items()]
+        ),
+    )
+    assistant_turns = sum(1 for item in history if item["role"] == "assistant")
+    profile = (
+        "agentic_proposal"
+        if assistant_turns >= _MAX_QUESTION_TURNS
+        else "agentic_question"
+    )
     try:
-        llm = get_llm()
-        response = llm.invoke([HumanMessage(content=prompt)])
-        parsed = parse_json_response(getattr(response, "content", ""))
-        turn = _coerce_turn(parsed)
+        text, context_cache = await generate_with_context_cache(
+            prefix, delta, profile, context_cache, validate=is_json_response
+        )
+        turn = _coerce_turn(parse_json_response(text))
     except Exception:
         turn = None
 
     if turn:
-        return turn
+        return turn, context_cache
 
-    return {
-        "kind": "question",
-        "content": (
-            "防災マニュアルを改善するために、補足したい情報があれば教えてください。"
-        ),
-    }
+    return (
+        {
+            "kind": "question",
+            "content": (
+                "防災マニュアルを改善するために、補足したい情報があれば教えてください。"
+            ),
+        },
+        context_cache,
+    )
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from typing import Any, Protocol
+
+from google.genai import types
+
+from app.core.config import get_settings
+from app.services.llm import ainvoke_text, call_with_deadline, get_llm_client
+from app.services.nanobanana import get_genai_client
+from app.utils.prompt_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Refresh a little before expiry so a turn never races the provider's TTL.
+_EXPIRY_MARGIN_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class CachedContext:
+    name: str
+    model: str
+    prefix_hash: str
+    expire_at: float
+
+
+def prefix_hash(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+
+class ContextCacheProvider(Protocol):
+    async def create(
+        self, model: str, prefix: str, ttl_seconds: int
+    ) -> CachedContext: ...
+
+    async def generate(
+        self, cached: CachedContext, prompt: str, profile: str
+    ) -> str: ...
+
+    async def delete(self, name: str) -> None: ...
+
+
+class GeminiContextCacheProvider:
+    async def create(self, model: str, prefix: str, ttl_seconds: int) -> CachedContext:
+        cached = await get_genai_client().aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix], ttl=f"{ttl_seconds}s"
+            ),
+        )
+        expire_at = (
+            cached.expire_time.timestamp()
+            if cached.expire_time
+            else time.time() + ttl_seconds
+        )
+        return CachedContext(cached.name, model, prefix_hash(prefix), expire_at)
+
+    async def generate(self, cached: CachedContext, prompt: str, profile: str) -> str:
+        config = get_settings().llm_profiles[profile]
+        response = await get_llm_client(profile).aio.models.generate_content(
+            model=cached.model,
+            contents=[prompt],
+            config=types.GenerateContentConfig(
+                cached_content=cached.name,
+                temperature=config.temperature,
+                max_output_tokens=config.max_output_tokens,
+            ),
+        )
+        return response.text or ""
+
+    async def delete(self, name: str) -> None:
+        await get_genai_client().aio.caches.delete(name=name)
+
+
+class InMemoryContextCacheProvider:
+    def __init__(
+        self, generate_text: Callable[[str, str], Awaitable[str]] = ainvoke_text
+    ) -> None:
+        self._generate_text = generate_text
+        self.prefixes: dict[str, str] = {}
+
+    async def create(self, model: str, prefix: str, ttl_seconds: int) -> CachedContext:
+        name = f"cachedContents/local-{uuid.uuid4().hex}"
+        self.prefixes[name] = prefix
+        return CachedContext(
+            name, model, prefix_hash(prefix), time.time() + ttl_seconds
+        )
+
+    async def generate(self, cached: CachedContext, prompt: str, profile: str) -> str:
+        prefix = self.prefixes.get(cached.name)
+        if prefix is None:
+            raise RuntimeError(f"Unknown cached context: {cached.name}")
+        return await self._generate_text(prefix + prompt, profile)
+
+    async def delete(self, name: str) -> None:
+        self.prefixes.pop(name, None)
+
+
+_provider: ContextCacheProvider | None = None
+_provider_loaded = False
+
+
+def get_context_cache_provider() -> ContextCacheProvider | None:
+    global _provider, _provider_loaded
+    if not _provider_loaded:
+        name = get_settings().context_cache_provider
+        if name == "gemini":
+            _provider = GeminiContextCacheProvider()
+        elif name == "memory":
+            _provider = InMemoryContextCacheProvider()
+        elif name != "none":
+            raise RuntimeError(f"Unknown CONTEXT_CACHE_PROVIDER: {name}")
+        _provider_loaded = True
+    return _provider
+
+
+def set_context_cache_provider(provider: ContextCacheProvider | None) -> None:
+    global _provider, _provider_loaded
+    _provider = provider
+    _provider_loaded = True
+
+
+def _cached_from_state(
+    state: dict[str, Any] | None, profile: str, model: str
+) -> CachedContext | None:
+    entry = (state or {}).get(profile)
+    if not isinstance(entry, dict) or entry.get("model") != model:
+        return None
+    try:
+        return CachedContext(
+            name=str(entry["name"]),
+            model=model,
+            prefix_hash=str(entry["prefix_hash"]),
+            expire_at=float(entry["expire_at"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def _ensure_cached_context(
+    provider: ContextCacheProvider,
+    state: dict[str, Any] | None,
+    profile: str,
+    model: str,
+    prefix: str,
+) -> CachedContext | None:
+    settings = get_settings()
+    current = _cached_from_state(state, profile, model)
+    if (
+        current is not None
+        and current.prefix_hash == prefix_hash(prefix)
+        and current.expire_at - time.time() > _EXPIRY_MARGIN_SECONDS
+    ):
+        return current
+    if estimate_tokens(prefix) < settings.context_cache_min_tokens:
+        return None
+    try:
+        created = await provider.create(
+            model, prefix, settings.context_cache_ttl_seconds
+        )
+    except Exception:
+        logger.warning("Context cache creation failed for %s", model, exc_info=True)
+        return None
+    if current is not None and current.expire_at > time.time():
+        try:
+            await provider.delete(current.name)
+        except Exception:
+            logger.info("Stale context cache %s was not deleted", current.name)
+    return created
+
+
+async def generate_with_context_cache(
+    prefix: str,
+    delta: str,
+    profile: str,
+    state: dict[str, Any] | None,
+    validate: Callable[[str], bool] | None = None,
+) -> tuple[str, dict[str, Any] | None]:
+    provider = get_context_cache_provider()
+    if provider is None:
+        return await ainvoke_text(prefix + delta, profile, validate=validate), state
+    model = get_settings().llm_profiles[profile].model
+    cached = await _ensure_cached_context(provider, state, profile, model, prefix)
+    if cached is None:
+        return await ainvoke_text(prefix + delta, profile, validate=validate), state
+
+    async def _generate() -> str:
+        return await provider.generate(cached, delta, profile)
+
+    try:
+        text = await call_with_deadline(profile, _generate)
+    except TimeoutError:
+        raise
+    except Exception:
+        logger.warning("Cached generation failed, resending full prompt", exc_info=True)
+        remaining = {
+            key: value for key, value in (state or {}).items() if key != profile
+        }
+        return await ainvoke_text(prefix + delta, profile, validate=validate), remaining
+    return text, {**(state or {}), profile: asdict(cached)}
@@ -1,12 +1,30 @@
 import json
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
 
 from fastapi import HTTPException
-from langchain_core.messages import HumanMessage
-from playwright.async_api import async_playwright
 
 from app.schemas.manual import IllustrationImage, IllustrationPrompt, InputImage
-from app.services.llm import get_llm
-from app.utils.parsing import parse_json_response
+from app.services.llm import ainvoke_text, astream_text
+from app.services.manual_html import (
+    count_manual_sections,
+    patch_manual_html,
+    render_manual_html,
+    section_id,
+    split_markdown_sections,
+)
+from app.services.renderer import RenderAsset, get_renderer
+from app.utils.concurrency import run_blocking
+from app.utils.parsing import (
+    IncrementalJsonParser,
+    is_json_response,
+    parse_json_response,
+)
+
+logger = logging.getLogger(__name__)
+
+_SECTION_EXCERPT_CHARS = 120
 
 
 def _build_markdown_prompt(
@@ -19,16 +37,10 @@ def _build_markdown_prompt(
 ) -> str:
     instructions = (
         "あなたは日本語の防災マニュアルを作成するアシスタントです。"
-        "必ず最初の1ページはマニュアルの表紙とし、以下のみを含めてください:"
-        "1) マニュアルタイトル(manual_title)"
-        "2) 名称"
-        "3) 発行年月"
-        "4) 発行者"
-        "表紙はMarkdown上で専用のセクションとして作成し、"
-        "タイトルは中央寄せ、発行年月と発行者はページ下部に配置してください。"
-        "表紙タイトルは名称と「防災マニュアル」を改行して2行で表示し、"
-        "名称が空の場合は「防災マニュアル」だけを1行で表示してください。"
-        "表紙で１ページ目を使うので、の２ページ目からセクション１を開始してください。"
+        "表紙(マニュアルタイトル、名称、発行年月、発行者)はシステムが"
+        "自動で作成するため、Markdownには表紙を含めないでください。"
+        "Markdownは「## 見出し」で始まるセクションの並びとし、"
+        "最初のセクションから本文を開始してください。"
         "メモと画像情報を参考に、PDF化に適したMarkdownを作成してください。"
         "入力画像は指定されたURLと説明を使ってMarkdownに差し込みます。"
         "input_imagesのpublic_urlはそれぞれ1回だけ使い、"
@@ -36,8 +48,9 @@ def _build_markdown_prompt(
         "さらに、適切な箇所に追加すべきイラストのプレースホルダーを"
         "Markdown中に挿入し、そのイラスト生成用プロンプトも作成してください。"
         "出力は必ずJSONのみで次の形式にしてください:\n"
-        '{"markdown": "...", "illustration_prompts": '
-        '[{"id": "illust-1", "prompt": "...", "alt": "..."}]}\n'
+        '{"illustration_prompts": '
+        '[{"id": "illust-1", "prompt": "...", "alt": "..."}], "markdown": "..."}\n'
+        "illustration_promptsを先に、markdownを後に出力してください。"
         "illustration_promptsは2〜3件の配列で、idはMarkdown内の"
         "プレースホルダー ![ALT](illustration://ID) と一致させます。"
         "イラストのプロンプトは日本語で、"
@@ -63,55 +76,47 @@ def _build_markdown_prompt(
     )
 
 
-def _build_html_prompt(
-    markdown: str,
-    input_images: list[InputImage],
-    illustration_images: list[IllustrationImage],
+def _build_markdown_revision_prompt(previous_markdown: str, proposal: str) -> str:
+    instructions = (
+        "あなたは日本語の防災マニュアルを最終調整するアシスタントです。"
+        "提案内容(proposal)を反映してMarkdown(previous_markdown)を更新してください。"
+        "変更が必要な箇所以外は絶対変更しないでください。"
+        "Markdownは「## 見出し」で始まるセクションの並びのまま保ってください。"
+        "画像 ![ALT](URL) と illustration://ID のプレースホルダーは"
+        "そのまま残してください。"
+        "本文には提案・改善案などの文言を入れず、"
+        "純粋なマニュアル本文だけにしてください。"
+        "出力は必ずJSONのみで次の形式にしてください:\n"
+        '{"markdown": "..."}\n'
+        "余計な説明やコードフェンスは不要です。\n\n"
+    )
+    payload = {
+        "proposal": proposal,
+        "previous_markdown": previous_markdown,
+    }
+    return (
+        instructions
+        + f"INPUT(JSON):\n{json.dumps(payload, ensure_ascii=False, indent=2)}"
+    )
+
+
+def _build_section_selection_prompt(
+    outline: list[dict[str, str]],
+    proposal: str,
 ) -> str:
     instructions = (
-        "あなたは日本語の防災マニュアルをHTML化するアシスタントです。"
-        "Markdownを読み、A4向けの完成HTML(<!doctype html>から</html>まで)"
-        "のみを返してください。"
-        "illustration://ID のプレースホルダーは、対応するURLに置換して"
-        "画像として差し込んでください。"
-        "input_imagesのpublic_urlはすべてHTMLに反映し、"
-        '画像は<div class="image-block">で囲み、'
-        '<img class="manual-image">で出力してください。'
-        "画像にstyle属性は付けないでください。"
-        "画像には枠線やボーダーを付けないでください。"
-        '表紙は<section class="cover">で構成し、'
-        "タイトルは中央寄せ、発行年月と発行者は下部に配置してください。"
-        "表紙タイトルは名称と「防災マニュアル」を改行して2行で表示し、"
-        "名称が空の場合は「防災マニュアル」だけを1行で表示してください。"
-        "CSSは<head>内の<style>に含め、読みやすい構成にしてください。"
-        "ページ分割が崩れないよう、A4印刷時の高さに合わせて"
-        "各セクションの高さ・余白を調整し、"
-        "長い文章は段落で分割して"
-        "適切に改ページ(page-break)されるようにしてください。"
-        "見出し直後の改ページや、段落の途中での改ページは避けてください。"
-        "必ず以下のCSSルールを含めてください:"
-        "@page { size: A4; margin: 18mm 14mm; }"
-        "h1, h2, h3 { page-break-after: avoid; break-after: avoid; }"
-        "p, li, table, section { page-break-inside: avoid; break-inside: avoid; }"
-        "section { margin-bottom: 12mm; }"
-        ".manual-image { width: 100%; max-width: 160mm; max-height: 90mm; "
-        "height: auto; object-fit: contain; border: none; }"
-        ".image-block img { max-width: 160mm !important; "
-        "max-height: 90mm !important; }"
-        ".image-block { margin: 6mm 0; display: flex; "
-        "justify-content: center; }"
-        ".cover { min-height: 240mm; display: flex; flex-direction: column; "
-        "justify-content: space-between; margin-bottom: 0; "
-        "page-break-after: always; }"
-        ".cover-title { text-align: center; margin-top: 40mm; }"
-        ".cover-meta { text-align: center; margin-bottom: 10mm; }"
-        "大きな表やリストは複数のsectionに分割して下さい。"
+        "あなたは日本語の防災マニュアルの改定箇所を特定するアシスタントです。"
+        "提案内容(proposal)を反映するために変更が必要なセクションを、"
+        "セクション一覧(sections)から必要最小限だけ選んでください。"
+        "新しいセクションの追加が必要な場合は、"
+        "追加位置の直前にあるセクションを選んでください。"
+        "出力は必ずJSONのみで次の形式にしてください:\n"
+        '{"section_ids": ["section-1"]}\n'
         "余計な説明やコードフェンスは不要です。\n\n"
     )
     payload = {
-        "markdown": markdown,
-        "input_images": input_images,
-        "illustration_images": illustration_images,
+        "proposal": proposal,
+        "sections": outline,
     }
     return (
         instructions
@@ -119,27 +124,29 @@ def _build_html_prompt(
     )
 
 
-def _build_agentic_html_prompt(
-    previous_markdown: str,
-    previous_html: str,
+def _build_section_patch_prompt(
+    sections: list[dict[str, str]],
     proposal: str,
 ) -> str:
     instructions = (
-        "あなたは、インプットされたほぼ完成された日本語の防災マニュアル(previous_html)を、最終調整するアシスタントです。"
-        "提案内容(proposal)を反映してHTML(previous_html)を更新してください。"
-        "previous_htmlの<head>とCSSは変更しないでください。"
-        "previous_htmlのレイアウトと画像配置ルールは絶対変更しないでください。"
+        "あなたは日本語の防災マニュアルの一部のセクションを改定するアシスタントです。"
+        "提案内容(proposal)を反映して、各セクション(sections)のMarkdownを"
+        "更新してください。"
         "変更が必要な箇所以外は絶対変更しないでください。"
-        "ページ分割には、絶対配慮してください。"
-        "outputは完成HTML(<!doctype html>から</html>まで)のみ。"
-        "outputにはバックスラッシュ(\\)やエスケープ文字列"
-        '(\\n, \\t, \\"など)を含めないでください。'
-        "余計な説明やコードフェンスは不要です。"
+        "各セクションは元の「## 見出し」から始めてください。"
+        "新しいセクションを追加する場合は、対象セクションの末尾に"
+        "「## 見出し」から追記してください。"
+        "画像 ![ALT](URL) と illustration://ID のプレースホルダーは"
+        "そのまま残してください。"
+        "本文には提案・改善案などの文言を入れず、"
+        "純粋なマニュアル本文だけにしてください。"
+        "出力は必ずJSONのみで次の形式にしてください:\n"
+        '{"sections": [{"id": "section-1", "markdown": "..."}]}\n'
+        "余計な説明やコードフェンスは不要です。\n\n"
     )
     payload = {
         "proposal": proposal,
-        "previous_markdown": previous_markdown,
-        "previous_html": previous_html,
+        "sections": sections,
     }
     return (
         instructions
@@ -167,25 +174,26 @@ def _ensure_input_images_in_markdown(
     return "\n".join(lines)
 
 
-def generate_markdown_with_prompts(
-    memo: str,
-    input_images: list[InputImage],
-    manual_title: str,
-    name: str,
-    author: str,
-    issued_on: str,
+def _coerce_illustration_prompt(item: Any, index: int) -> IllustrationPrompt | None:
+    if not isinstance(item, dict):
+        return None
+    prompt_text = item.get("prompt")
+    if not isinstance(prompt_text, str) or not prompt_text.strip():
+        return None
+    prompt_id = item.get("id")
+    if not isinstance(prompt_id, str) or not prompt_id.strip():
+        prompt_id = f"illust-{index}"
+    alt_text = item.get("alt")
+    return {
+        "id": prompt_id.strip(),
+        "prompt": prompt_text.strip(),
+        "alt": alt_text.strip() if isinstance(alt_text, str) else None,
+    }
+
+
+def _parse_markdown_payload(
+    payload: dict[str, Any] | None, input_images: list[InputImage]
 ) -> tuple[str, list[IllustrationPrompt]]:
-    llm = get_llm()
-    prompt = _build_markdown_prompt(
-        memo,
-        input_images,
-        manual_title,
-        name,
-        author,
-        issued_on,
-    )
-    response = llm.invoke([HumanMessage(content=prompt)])
-    payload = parse_json_response(response.content or "")
     if not payload:
         raise HTTPException(status_code=500, detail="Markdown generation failed")
 
@@ -197,68 +205,171 @@ def generate_markdown_with_prompts(
     prompts: list[IllustrationPrompt] = []
     if isinstance(raw_prompts, list):
         for index, item in enumerate(raw_prompts, start=1):
-            if not isinstance(item, dict):
-                continue
-            prompt_text = item.get("prompt")
-            if not isinstance(prompt_text, str) or not prompt_text.strip():
-                continue
-            prompt_id = item.get("id")
-            if not isinstance(prompt_id, str) or not prompt_id.strip():
-                prompt_id = f"illust-{index}"
-            alt_text = item.get("alt")
-            prompts.append(
-                {
-                    "id": prompt_id.strip(),
-                    "prompt": prompt_text.strip(),
-                    "alt": alt_text.strip() if isinstance(alt_text, str) else None,
-                }
-            )
+            illustration = _coerce_illustration_prompt(item, index)
+            if illustration:
+                prompts.append(illustration)
 
     markdown = _ensure_input_images_in_markdown(markdown.strip(), input_images)
     return markdown, prompts
 
 
+async def stream_markdown_with_prompts(
+    memo: str,
+    input_images: list[InputImage],
+    manual_title: str,
+    name: str,
+    author: str,
+    issued_on: str,
+    on_prompt: Callable[[int, IllustrationPrompt], None] | None = None,
+    on_markdown: Callable[[str], Awaitable[None]] | None = None,
+) -> tuple[str, list[IllustrationPrompt]]:
+    prompt = _build_markdown_prompt(
+        memo,
+        input_images,
+        manual_title,
+        name,
+        author,
+        issued_on,
+    )
+    parser = IncrementalJsonParser()
+    raw_index = 0
+    position = 0
+    async for content in astream_text(prompt, "markdown", validate=is_json_response):
+        for kind, key, value in parser.feed(content):
+            if key == "illustration_prompts" and kind == "item":
+                raw_index += 1
+                illustration = _coerce_illustration_prompt(value, raw_index)
+                if illustration and on_prompt is not None:
+                    position += 1
+                    on_prompt(position, illustration)
+            elif key == "markdown" and on_markdown is not None:
+                await on_markdown(value)
+    payload = parse_json_response(parser.text)
+    return _parse_markdown_payload(payload, input_images)
+
+
 def generate_manual_html_from_markdown(
     markdown: str,
-    input_images: list[InputImage],
     illustration_images: list[IllustrationImage],
+    manual_title: str,
+    name: str,
+    author: str,
+    issued_on: str,
 ) -> tuple[str, str]:
-    llm = get_llm()
-    prompt = _build_html_prompt(markdown, input_images, illustration_images)
-    response = llm.invoke([HumanMessage(content=prompt)])
-    html = (response.content or "").strip()
-    if not html:
-        raise HTTPException(status_code=500, detail="HTML generation failed")
+    html = render_manual_html(
+        markdown,
+        illustration_images,
+        manual_title,
+        name,
+        author,
+        issued_on,
+    )
     return html, markdown
 
 
-def generate_manual_html_with_proposal(
+async def _select_sections(sections: list[str], proposal: str) -> list[int]:
+    outline = []
+    for index, section in enumerate(sections):
+        heading, _, body = section.partition("\n")
+        outline.append(
+            {
+                "id": section_id(index),
+                "heading": heading.strip(),
+                "excerpt": body.strip()[:_SECTION_EXCERPT_CHARS],
+            }
+        )
+    prompt = _build_section_selection_prompt(outline, proposal)
+    text = await ainvoke_text(prompt, "html_patch", validate=is_json_response)
+    payload = parse_json_response(text) or {}
+    raw_ids = payload.get("section_ids")
+    indexes = {section_id(index): index for index in range(len(sections))}
+    selected: set[int] = set()
+    if isinstance(raw_ids, list):
+        for raw_id in raw_ids:
+            if isinstance(raw_id, str) and raw_id.strip() in indexes:
+                selected.add(indexes[raw_id.strip()])
+    return sorted(selected)
+
+
+async def _rewrite_sections(
+    sections: list[str],
+    selected: list[int],
+    proposal: str,
+) -> dict[int, str]:
+    targets = [
+        {"id": section_id(index), "markdown": sections[index]} for index in selected
+    ]
+    prompt = _build_section_patch_prompt(targets, proposal)
+    text = await ainvoke_text(prompt, "html_patch", validate=is_json_response)
+    payload = parse_json_response(text) or {}
+    raw_sections = payload.get("sections")
+    indexes = {section_id(index): index for index in selected}
+    replacements: dict[int, str] = {}
+    if isinstance(raw_sections, list):
+        for item in raw_sections:
+            if not isinstance(item, dict):
+                continue
+            raw_id = item.get("id")
+            markdown = item.get("markdown")
+            if not isinstance(raw_id, str) or raw_id.strip() not in indexes:
+                continue
+            if not isinstance(markdown, str) or not markdown.strip():
+                continue
+            replacements[indexes[raw_id.strip()]] = markdown.strip()
+    return replacements
+
+
+async def generate_manual_html_with_proposal(
     previous_markdown: str,
     previous_html: str,
     proposal: str,
+    illustration_images: list[IllustrationImage],
+    manual_title: str,
+    name: str,
+    author: str,
+    issued_on: str,
 ) -> tuple[str, str]:
-    llm = get_llm()
-    prompt = _build_agentic_html_prompt(
-        previous_markdown,
-        previous_html,
-        proposal,
+    sections = split_markdown_sections(previous_markdown)
+    section_count = count_manual_sections(previous_html)
+    if not section_count:
+        # Sessions created before section markers store LLM-written HTML whose
+        # Markdown carries its own cover; rendering it with the template would
+        # add a second one, so that HTML is kept.
+        logger.info("Keeping legacy manual HTML without section markers")
+        return previous_html, previous_markdown
+    if sections and section_count == len(sections):
+        selected = await _select_sections(sections, proposal)
+        if not selected:
+            return previous_html, previous_markdown
+        replacements = await _rewrite_sections(sections, selected, proposal)
+        patched = None
+        if replacements:
+            patched = patch_manual_html(
+                previous_html, sections, replacements, illustration_images
+            )
+        if patched:
+            return patched
+
+    # Without a section patch, revise the whole Markdown and render the HTML
+    # from it so the stored Markdown and HTML stay in sync.
+    prompt = _build_markdown_revision_prompt(previous_markdown, proposal)
+    text = await ainvoke_text(prompt, "markdown_revision", validate=is_json_response)
+    payload = parse_json_response(text)
+    markdown = (payload or {}).get("markdown")
+    if not isinstance(markdown, str) or not markdown.strip():
+        raise HTTPException(status_code=500, detail="Markdown revision failed")
+    return await run_blocking(
+        generate_manual_html_from_markdown,
+        markdown.strip(),
+        illustration_images,
+        manual_title,
+        name,
+        author,
+        issued_on,
     )
-    response = llm.invoke([HumanMessage(content=prompt)])
-    html = (response.content or "").strip()
-    if not html:
-        raise HTTPException(status_code=500, detail="HTML generation failed")
-    return html, previous_markdown
-
-
-async def generate_manual_pdf(html: str) -> bytes:
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch()
-        page = await browser.new_page()
-        await page.set_content(html, wait_until="networkidle")
-        pdf_bytes = await page.pdf(
-            format="A4",
-            print_background=True,
-            margin={"top": "18mm", "bottom": "18mm", "left": "14mm", "right": "14mm"},
-        )
-        await browser.close()
-    return pdf_bytes
+
+
+async def generate_manual_pdf(
+    html: str, assets: dict[str, RenderAsset] | None = None
+) -> bytes:
+    return await get_renderer().render_pdf(html, assets)
@@ -0,0 +1,111 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import get_settings
+from app.services.storage import get_blob_metadata, public_url, upload_bytes
+from app.utils.concurrency import run_blocking
+from app.utils.text_index import normalize_text
+
+ILLUSTRATION_CACHE_PREFIX = "illustration_cache/"
+
+
+@dataclass(frozen=True)
+class CachedIllustration:
+    blob_name: str
+    gcs_uri: str
+    public_url: str
+    content_type: str
+
+
+def illustration_cache_key(prompt: str, model: str) -> str:
+    source = f"{model}\n{normalize_text(prompt)}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def illustration_cache_blob_name(key: str) -> str:
+    return f"{ILLUSTRATION_CACHE_PREFIX}{key}.png"
+
+
+# max_entries bounds the in-process index only. Session HTML links straight to
+# the cached blobs, so evicting an entry must not delete its blob; the blobs
+# under ILLUSTRATION_CACHE_PREFIX are kept for as long as sessions may use them.
+class IllustrationCache:
+    def __init__(self, bucket: str, max_entries: int) -> None:
+        self._bucket = bucket
+        self._max_entries = max(max_entries, 1)
+        self._entries: OrderedDict[str, CachedIllustration] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.index_evictions = 0
+
+    def _entry(self, key: str, content_type: str) -> CachedIllustration:
+        blob_name = illustration_cache_blob_name(key)
+        return CachedIllustration(
+            blob_name=blob_name,
+            gcs_uri=f"gs://{self._bucket}/{blob_name}",
+            public_url=public_url(self._bucket, blob_name),
+            content_type=content_type,
+        )
+
+    def _remember(self, key: str, entry: CachedIllustration) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.index_evictions += 1
+
+    async def lookup(self, key: str) -> CachedIllustration | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        metadata = await run_blocking(
+            get_blob_metadata, self._bucket, illustration_cache_blob_name(key)
+        )
+        if metadata is None:
+            self.misses += 1
+            return None
+        entry = self._entry(key, metadata.get("content_type") or "image/png")
+        self._remember(key, entry)
+        self.hits += 1
+        return entry
+
+    async def store(
+        self, key: str, image_bytes: bytes, content_type: str
+    ) -> CachedIllustration:
+        entry = self._entry(key, content_type)
+        await run_blocking(
+            upload_bytes, self._bucket, entry.blob_name, image_bytes, content_type
+        )
+        self._remember(key, entry)
+        return entry
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "index_evictions": self.index_evictions,
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+        }
+
+
+_caches: dict[str, IllustrationCache] = {}
+
+
+def get_illustration_cache(bucket: str) -> IllustrationCache | None:
+    settings = get_settings()
+    if not settings.illustration_cache_enabled:
+        return None
+    cache = _caches.get(bucket)
+    if cache is None:
+        cache = IllustrationCache(bucket, settings.illustration_cache_max_entries)
+        _caches[bucket] = cache
+    return cache
+
+
+def illustration_cache_stats() -> dict[str, dict[str, Any]]:
+    return {bucket: cache.stats() for bucket, cache in _caches.items()}
@@ -0,0 +1,183 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import time
+from typing import Any, TypedDict
+
+from app.core.config import get_settings
+from app.schemas.manual import IllustrationPrompt
+from app.services.illustration_cache import ILLUSTRATION_CACHE_PREFIX
+from app.services.sessions import list_sessions
+from app.services.storage import copy_blob, download_bytes, public_url, upload_bytes
+from app.utils.concurrency import run_blocking
+from app.utils.text_index import TfidfIndex
+
+logger = logging.getLogger(__name__)
+
+CATALOG_BLOB_NAME = "illustration_catalog/index.json"
+CATALOG_IMAGES_PREFIX = "illustration_catalog/images/"
+
+
+class CatalogEntry(TypedDict):
+    prompt: str
+    alt: str | None
+    public_url: str
+    gcs_uri: str | None
+    content_type: str | None
+
+
+def _entry_text(prompt: str, alt: str | None) -> str:
+    return f"{prompt} {alt}" if alt else prompt
+
+
+class IllustrationCatalog:
+    def __init__(self, entries: list[CatalogEntry]) -> None:
+        self.entries = entries
+        self._index = TfidfIndex.build(
+            [_entry_text(entry["prompt"], entry.get("alt")) for entry in entries]
+        )
+
+    def match(
+        self, prompt: IllustrationPrompt, threshold: float
+    ) -> tuple[CatalogEntry, float] | None:
+        if not self.entries:
+            return None
+        results = self._index.search(
+            _entry_text(prompt["prompt"], prompt.get("alt")), top_k=1
+        )
+        if not results:
+            return None
+        position, score = results[0]
+        if score < threshold:
+            return None
+        return self.entries[position], score
+
+
+def _coerce_entry(item: Any) -> CatalogEntry | None:
+    if not isinstance(item, dict):
+        return None
+    prompt = item.get("prompt")
+    url = item.get("public_url")
+    if not isinstance(prompt, str) or not prompt.strip():
+        return None
+    if not isinstance(url, str) or not url:
+        return None
+    alt = item.get("alt")
+    return {
+        "prompt": prompt.strip(),
+        "alt": alt.strip() if isinstance(alt, str) and alt.strip() else None,
+        "public_url": url,
+        "gcs_uri": item.get("gcs_uri"),
+        "content_type": item.get("content_type"),
+    }
+
+
+def load_catalog_entries(bucket: str) -> list[CatalogEntry]:
+    data = download_bytes(bucket, CATALOG_BLOB_NAME)
+    if not data:
+        return []
+    payload = json.loads(data)
+    entries: list[CatalogEntry] = []
+    for item in payload.get("entries") or []:
+        entry = _coerce_entry(item)
+        if entry:
+            entries.append(entry)
+    return entries
+
+
+def save_catalog_entries(bucket: str, entries: list[CatalogEntry]) -> None:
+    payload = {
+        "built_at": datetime.datetime.now(datetime.UTC).isoformat(),
+        "entries": entries,
+    }
+    upload_bytes(
+        bucket,
+        CATALOG_BLOB_NAME,
+        json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        "application/json",
+    )
+
+
+def collect_session_illustrations(limit: int) -> list[CatalogEntry]:
+    entries: list[CatalogEntry] = []
+    for session in list_sessions(limit=limit):
+        inputs = session.get("inputs") or {}
+        step2 = inputs.get("step2") if isinstance(inputs, dict) else None
+        if not isinstance(step2, dict):
+            continue
+        for item in step2.get("illustration_images") or []:
+            entry = _coerce_entry(item)
+            if entry:
+                entries.append(entry)
+    return entries
+
+
+def merge_entries(
+    existing: list[CatalogEntry], incoming: list[CatalogEntry]
+) -> list[CatalogEntry]:
+    merged: dict[str, CatalogEntry] = {}
+    for entry in [*existing, *incoming]:
+        merged.setdefault(entry["public_url"], entry)
+    return list(merged.values())
+
+
+def _archive_blob_name(entry: CatalogEntry) -> str:
+    digest = hashlib.sha256(entry["public_url"].encode("utf-8")).hexdigest()
+    return f"{CATALOG_IMAGES_PREFIX}{digest}.png"
+
+
+def archive_entry(bucket: str, entry: CatalogEntry) -> CatalogEntry | None:
+    gcs_uri = entry.get("gcs_uri") or ""
+    prefix = f"gs://{bucket}/"
+    if not gcs_uri.startswith(prefix):
+        return None
+    source = gcs_uri[len(prefix) :]
+    if source.startswith((CATALOG_IMAGES_PREFIX, ILLUSTRATION_CACHE_PREFIX)):
+        return entry
+    destination = _archive_blob_name(entry)
+    if not copy_blob(bucket, source, destination):
+        return None
+    return {
+        **entry,
+        "public_url": public_url(bucket, destination),
+        "gcs_uri": f"gs://{bucket}/{destination}",
+    }
+
+
+_catalogs: dict[str, tuple[IllustrationCatalog, float]] = {}
+_catalog_lock = asyncio.Lock()
+
+
+async def get_illustration_catalog(bucket: str) -> IllustrationCatalog | None:
+    settings = get_settings()
+    if not settings.illustration_catalog_enabled:
+        return None
+    cached = _catalogs.get(bucket)
+    refresh_after = settings.illustration_catalog_refresh_seconds
+    if cached is not None and time.monotonic() - cached[1] < refresh_after:
+        return cached[0]
+    async with _catalog_lock:
+        cached = _catalogs.get(bucket)
+        if cached is not None and time.monotonic() - cached[1] < refresh_after:
+            return cached[0]
+        try:
+            entries = await run_blocking(load_catalog_entries, bucket)
+        except Exception:
+            logger.warning("Illustration catalog could not be loaded", exc_info=True)
+            return cached[0] if cached else None
+        catalog = IllustrationCatalog(entries)
+        _catalogs[bucket] = (catalog, time.monotonic())
+    return catalog
+
+
+async def find_catalog_illustration(
+    bucket: str, prompt: IllustrationPrompt
+) -> CatalogEntry | None:
+    catalog = await get_illustration_catalog(bucket)
+    if catalog is None:
+        return None
+    settings = get_settings()
+    matched = catalog.match(prompt, settings.illustration_catalog_threshold)
+    return matched[0] if matched else None
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+
+from app.core.config import get_settings
+from app.schemas.manual import IllustrationImage, IllustrationPrompt
+from app.services.illustration_cache import (
+    get_illustration_cache,
+    illustration_cache_blob_name,
+    illustration_cache_key,
+)
+from app.services.illustration_catalog import CatalogEntry, find_catalog_illustration
+from app.services.images import optimize_image
+from app.services.nanobanana import generate_illustration
+from app.services.renderer import RenderAsset
+from app.services.storage import public_url, upload_bytes
+from app.utils.concurrency import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+def illustration_blob_name(session_id: str, illustration_id: str, index: int) -> str:
+    return f"sessions/{session_id}/output/illustrations/{illustration_id}-{index}.png"
+
+
+def original_blob_name(blob_name: str) -> str:
+    stem, extension = os.path.splitext(blob_name)
+    return f"{stem}-original{extension}"
+
+
+def _target_blob_name(
+    session_id: str, index: int, prompt: IllustrationPrompt, cache_key: str | None
+) -> str:
+    if cache_key is not None:
+        return illustration_cache_blob_name(cache_key)
+    return illustration_blob_name(session_id, prompt["id"], index)
+
+
+def _cache_key(bucket: str, prompt: IllustrationPrompt) -> str | None:
+    if get_illustration_cache(bucket) is None:
+        return None
+    settings = get_settings()
+    return illustration_cache_key(prompt["prompt"], settings.nanobanana_model)
+
+
+def _catalog_image(
+    prompt: IllustrationPrompt, entry: CatalogEntry
+) -> IllustrationImage:
+    return {
+        "id": prompt["id"],
+        "prompt": prompt["prompt"],
+        "public_url": entry["public_url"],
+        "gcs_uri": entry.get("gcs_uri"),
+        "content_type": entry.get("content_type"),
+        "alt": prompt.get("alt"),
+    }
+
+
+async def planned_illustration_images(
+    session_id: str, bucket: str, prompts: list[IllustrationPrompt]
+) -> list[IllustrationImage]:
+    images: list[IllustrationImage] = []
+    for index, prompt in enumerate(prompts, start=1):
+        entry = await find_catalog_illustration(bucket, prompt)
+        if entry is not None:
+            images.append(_catalog_image(prompt, entry))
+            continue
+        blob_name = _target_blob_name(
+            session_id, index, prompt, _cache_key(bucket, prompt)
+        )
+        images.append(
+            {
+                "id": prompt["id"],
+                "prompt": prompt["prompt"],
+                "public_url": public_url(bucket, blob_name),
+                "gcs_uri": f"gs://{bucket}/{blob_name}",
+                "content_type": None,
+                "alt": prompt.get("alt"),
+            }
+        )
+    return images
+
+
+async def _generate_and_upload(
+    session_id: str,
+    bucket: str,
+    index: int,
+    prompt: IllustrationPrompt,
+    semaphore: asyncio.Semaphore,
+    timeout: float,
+) -> tuple[IllustrationImage, RenderAsset | None] | None:
+    entry = await find_catalog_illustration(bucket, prompt)
+    if entry is not None:
+        return _catalog_image(prompt, entry), None
+    cache = get_illustration_cache(bucket)
+    cache_key = _cache_key(bucket, prompt)
+    image: IllustrationImage = {
+        "id": prompt["id"],
+        "prompt": prompt["prompt"],
+        "public_url": "",
+        "gcs_uri": None,
+        "content_type": None,
+        "alt": prompt.get("alt"),
+    }
+    async with semaphore:
+        try:
+            if cache is not None and cache_key is not None:
+                cached = await cache.lookup(cache_key)
+                if cached is not None:
+                    image["public_url"] = cached.public_url
+                    image["gcs_uri"] = cached.gcs_uri
+                    image["content_type"] = cached.content_type
+                    return image, None
+            original_bytes, original_type = await asyncio.wait_for(
+                generate_illustration(prompt["prompt"]), timeout=timeout
+            )
+            optimized = await run_blocking(optimize_image, original_bytes, True)
+            image_bytes, content_type = optimized or (original_bytes, original_type)
+            if cache is not None and cache_key is not None:
+                stored = await cache.store(cache_key, image_bytes, content_type)
+                blob_name = stored.blob_name
+                gcs_uri = stored.gcs_uri
+            else:
+                blob_name = _target_blob_name(session_id, index, prompt, None)
+                gcs_uri = await run_blocking(
+                    upload_bytes, bucket, blob_name, image_bytes, content_type
+                )
+            if image_bytes is not original_bytes:
+                await run_blocking(
+                    upload_bytes,
+                    bucket,
+                    original_blob_name(blob_name),
+                    original_bytes,
+                    original_type,
+                )
+        except Exception:
+            logger.warning("Illustration %s failed", prompt["id"], exc_info=True)
+            return None
+    image["public_url"] = public_url(bucket, blob_name)
+    image["gcs_uri"] = gcs_uri
+    image["content_type"] = content_type
+    return image, (image_bytes, content_type)
+
+
+class IllustrationBatch:
+    def __init__(self, session_id: str, bucket: str) -> None:
+        settings = get_settings()
+        self._session_id = session_id
+        self._bucket = bucket
+        self._timeout = settings.illustration_timeout_seconds
+        self._semaphore = asyncio.Semaphore(max(settings.illustration_concurrency, 1))
+        self._tasks: dict[
+            tuple[int, str, str],
+            asyncio.Task[tuple[IllustrationImage, RenderAsset | None] | None],
+        ] = {}
+
+    def submit(self, index: int, prompt: IllustrationPrompt) -> None:
+        key = (index, prompt["id"], prompt["prompt"])
+        if key in self._tasks:
+            return
+        self._tasks[key] = asyncio.create_task(
+            _generate_and_upload(
+                self._session_id,
+                self._bucket,
+                index,
+                prompt,
+                self._semaphore,
+                self._timeout,
+            )
+        )
+
+    def cancel(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+
+    async def collect(
+        self, prompts: list[IllustrationPrompt]
+    ) -> tuple[list[IllustrationImage], dict[str, RenderAsset]]:
+        keys = []
+        for index, prompt in enumerate(prompts, start=1):
+            self.submit(index, prompt)
+            keys.append((index, prompt["id"], prompt["prompt"]))
+        for key, task in self._tasks.items():
+            if key not in keys:
+                task.cancel()
+        results = await asyncio.gather(*(self._tasks[key] for key in keys))
+        images: list[IllustrationImage] = []
+        assets: dict[str, RenderAsset] = {}
+        for result in results:
+            if result is None:
+                continue
+            image, asset = result
+            images.append(image)
+            if asset is not None:
+                assets[image["public_url"]] = asset
+        return images, assets
@@ -0,0 +1,96 @@
+import io
+import os
+from typing import BinaryIO
+
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+
+from app.core.config import get_settings
+from app.services.manual_html import (
+    MANUAL_IMAGE_MAX_HEIGHT_MM,
+    MANUAL_IMAGE_MAX_WIDTH_MM,
+)
+
+_MM_PER_INCH = 25.4
+
+OptimizedImage = tuple[bytes, str]
+
+
+def print_size_pixels(dpi: int) -> tuple[int, int]:
+    return (
+        round(MANUAL_IMAGE_MAX_WIDTH_MM / _MM_PER_INCH * dpi),
+        round(MANUAL_IMAGE_MAX_HEIGHT_MM / _MM_PER_INCH * dpi),
+    )
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    if image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    ):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _read_source(source: bytes | BinaryIO) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    source.seek(0)
+    return source.read()
+
+
+def optimize_image(
+    source: bytes | BinaryIO, lossless: bool = False
+) -> OptimizedImage | None:
+    settings = get_settings()
+    if isinstance(source, bytes):
+        stream: BinaryIO = io.BytesIO(source)
+        source_length = len(source)
+    else:
+        stream = source
+        source_length = stream.seek(0, os.SEEK_END)
+        stream.seek(0)
+    target_size = print_size_pixels(settings.image_print_dpi)
+    try:
+        with Image.open(stream) as opened:
+            source_format = opened.format
+            source_size = opened.size
+            orientation = opened.getexif().get(ExifTags.Base.Orientation, 1)
+            # JPEG can decode at a reduced scale, which keeps large photos cheap.
+            side = max(target_size)
+            opened.draft("RGB", (side, side))
+            image = ImageOps.exif_transpose(opened)
+            image.thumbnail(target_size, Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            if lossless:
+                if image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+                    image = image.convert("RGBA")
+                image.save(output, format="PNG", optimize=True)
+                target_format, content_type = "PNG", "image/png"
+            else:
+                _flatten(image).save(
+                    output,
+                    format="JPEG",
+                    quality=settings.image_jpeg_quality,
+                    optimize=True,
+                    progressive=True,
+                )
+                target_format, content_type = "JPEG", "image/jpeg"
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+    optimized = output.getvalue()
+    unchanged = (
+        orientation == 1
+        and image.size == source_size
+        and source_format == target_format
+    )
+    if unchanged and len(optimized) >= source_length:
+        return _read_source(source), content_type
+    return optimized, content_type
+
+
+def optimized_filename(filename: str, content_type: str) -> str:
+    stem, _ = os.path.splitext(filename)
+    extension = ".png" if content_type == "image/png" else ".jpg"
+    return f"{stem or 'image'}{extension}"
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any
+
+from fastapi import HTTPException
+
+from app.schemas.manual import InputImage
+from app.services.pipeline import run_generation
+from app.services.renderer import RenderAsset
+from app.services.sessions import update_session
+from app.utils.concurrency import run_blocking
+
+logger = logging.getLogger(__name__)
+
+_PREVIEW_INTERVAL_SECONDS = 1.5
+
+_tasks: dict[str, asyncio.Task] = {}
+
+
+def is_job_running(session_id: str) -> bool:
+    task = _tasks.get(session_id)
+    return task is not None and not task.done()
+
+
+def _forget_task(session_id: str, task: asyncio.Task) -> None:
+    if _tasks.get(session_id) is task:
+        del _tasks[session_id]
+
+
+def _job_state(
+    job_id: str,
+    session_id: str,
+    status: str,
+    stage: str | None = None,
+    error: str | None = None,
+    preview_markdown: str | None = None,
+) -> dict[str, Any]:
+    return {
+        "id": job_id,
+        "session_id": session_id,
+        "status": status,
+        "stage": stage,
+        "error": error,
+        "preview_markdown": preview_markdown,
+    }
+
+
+async def _run_job(
+    job_id: str,
+    session_id: str,
+    session: dict[str, Any],
+    bucket: str,
+    memo: str,
+    uploaded_images: list[InputImage],
+    render_assets: dict[str, RenderAsset],
+) -> None:
+    current_stage: str | None = None
+    preview: str | None = None
+    preview_written_at = 0.0
+
+    async def _write_running() -> None:
+        await run_blocking(
+            update_session,
+            session_id,
+            {
+                "job": _job_state(
+                    job_id, session_id, "running", current_stage, None, preview
+                )
+            },
+        )
+
+    async def _on_stage(stage: str) -> None:
+        nonlocal current_stage
+        current_stage = stage
+        await _write_running()
+
+    async def _on_markdown(text: str) -> None:
+        nonlocal preview, preview_written_at
+        preview = text
+        now = time.monotonic()
+        if now - preview_written_at < _PREVIEW_INTERVAL_SECONDS:
+            return
+        preview_written_at = now
+        await _write_running()
+
+    try:
+        await run_generation(
+            session_id,
+            session,
+            bucket,
+            memo,
+            uploaded_images,
+            render_assets,
+            _on_stage,
+            _on_markdown,
+        )
+    except Exception as exc:
+        logger.exception("Generation job %s failed", job_id)
+        detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+        await run_blocking(
+            update_session,
+            session_id,
+            {
+                "status": "step2",
+                "job": _job_state(
+                    job_id, session_id, "failed", current_stage, str(detail), preview
+                ),
+            },
+        )
+        return
+    await run_blocking(
+        update_session,
+        session_id,
+        {"job": _job_state(job_id, session_id, "done", current_stage)},
+    )
+
+
+async def start_generation_job(
+    session_id: str,
+    session: dict[str, Any],
+    bucket: str,
+    memo: str,
+    uploaded_images: list[InputImage],
+    render_assets: dict[str, RenderAsset],
+) -> dict[str, Any]:
+    job = _job_state(uuid.uuid4().hex, session_id, "queued")
+    await run_blocking(
+        update_session,
+        session_id,
+        {
+            "status": "generating",
+            "job": job,
+            "inputs": {"step2": {"memo": memo, "uploaded_images": uploaded_images}},
+        },
+    )
+    task = asyncio.create_task(
+        _run_job(
+            job["id"],
+            session_id,
+            session,
+            bucket,
+            memo,
+            uploaded_images,
+            render_assets,
+        )
+    )
+    _tasks[session_id] = task
+    task.add_done_callback(lambda done: _forget_task(session_id, done))
+    return job
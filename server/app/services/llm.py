@@ -1,19 +1,347 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import logging
+import random
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from dataclasses import asdict, dataclass
+from typing import Any, TypeVar
 
-from app.core.config import get_settings
+import requests
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types
 
-_llm: ChatGoogleGenerativeAI | None = None
+from app.core.config import LLMProfile, get_settings
+from app.services.llm_cache import (
+    LLMCacheBackend,
+    MemoryLLMCache,
+    SqliteLLMCache,
+    llm_cache_key,
+)
+from app.utils.concurrency import run_blocking
+from app.utils.hedging import DeadlineExceededError, LatencyTracker, hedged_call
 
+logger = logging.getLogger(__name__)
 
-def get_llm() -> ChatGoogleGenerativeAI:
-    global _llm
-    if _llm is None:
+T = TypeVar("T")
+
+_TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Truncated or blocked replies are returned to the caller but never cached.
+_UNCACHEABLE_FINISH_REASONS = frozenset({"MAX_TOKENS", "SAFETY"})
+
+_clients: dict[float, genai.Client] = {}
+_cache: LLMCacheBackend | None = None
+_cache_loaded = False
+
+
+def _is_transient(exc: Exception) -> bool:
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code in _TRANSIENT_STATUS_CODES
+    return isinstance(
+        exc,
+        TimeoutError | ConnectionError | requests.ConnectionError | requests.Timeout,
+    )
+
+
+def _profile_config(profile: str) -> LLMProfile:
+    config = get_settings().llm_profiles.get(profile)
+    if config is None:
+        raise RuntimeError(f"Unknown LLM profile: {profile}")
+    return config
+
+
+def _generation_config(config: LLMProfile) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        temperature=config.temperature,
+        max_output_tokens=config.max_output_tokens,
+    )
+
+
+def get_llm_cache() -> LLMCacheBackend | None:
+    global _cache, _cache_loaded
+    if not _cache_loaded:
+        settings = get_settings()
+        backend = settings.llm_cache_backend
+        if backend == "memory":
+            _cache = MemoryLLMCache(
+                settings.llm_cache_max_entries, settings.llm_cache_ttl_seconds
+            )
+        elif backend == "sqlite":
+            _cache = SqliteLLMCache(
+                settings.llm_cache_path,
+                settings.llm_cache_max_entries,
+                settings.llm_cache_ttl_seconds,
+            )
+        elif backend != "none":
+            raise RuntimeError(f"Unknown LLM_CACHE_BACKEND: {backend}")
+        _cache_loaded = True
+    return _cache
+
+
+def llm_cache_stats() -> dict | None:
+    cache = get_llm_cache()
+    return cache.stats() if cache is not None else None
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    hedges_fired: int = 0
+    hedges_won: int = 0
+    retries: int = 0
+    deadline_exceeded: int = 0
+    failures: int = 0
+
+
+_stage_stats: dict[str, StageStats] = {}
+_stage_latencies: dict[str, LatencyTracker] = {}
+
+
+def llm_call_stats() -> dict[str, dict[str, Any]]:
+    settings = get_settings()
+    stats: dict[str, dict[str, Any]] = {}
+    for stage, counters in _stage_stats.items():
+        tracker = _stage_latencies.get(stage)
+        stats[stage] = {
+            **asdict(counters),
+            "hedge_delay_seconds": (
+                tracker.percentile(
+                    settings.llm_hedge_percentile, settings.llm_hedge_min_samples
+                )
+                if tracker
+                else None
+            ),
+        }
+    return stats
+
+
+def _stage_deadline(stage: str) -> float:
+    settings = get_settings()
+    return settings.llm_stage_deadlines.get(
+        stage, settings.llm_default_deadline_seconds
+    )
+
+
+def _hedge_delay(stage: str) -> float | None:
+    settings = get_settings()
+    if not settings.llm_hedge_enabled:
+        return None
+    tracker = _stage_latencies.setdefault(stage, LatencyTracker())
+    delay = tracker.percentile(
+        settings.llm_hedge_percentile, settings.llm_hedge_min_samples
+    )
+    return settings.llm_hedge_initial_delay_seconds if delay is None else delay
+
+
+def get_llm_client(stage: str) -> genai.Client:
+    # The SDK sends requests from worker threads that asyncio cannot cancel.
+    # A hedge loser or an attempt past its deadline keeps its thread, and the
+    # model may still finish (and bill) it server-side; the HTTP timeout bounds
+    # how long such an abandoned request can hold a thread.
+    timeout = _stage_deadline(stage)
+    client = _clients.get(timeout)
+    if client is None:
         settings = get_settings()
         if not settings.gemini_api_key:
             raise RuntimeError("GEMINI_API_KEY is not set")
-        _llm = ChatGoogleGenerativeAI(
-            model=settings.gemini_model,
-            temperature=0.3,
-            google_api_key=settings.gemini_api_key,
+        client = genai.Client(
+            api_key=settings.gemini_api_key, http_options={"timeout": timeout}
         )
-    return _llm
+        _clients[timeout] = client
+    return client
+
+
+async def call_with_deadline(
+    stage: str,
+    factory: Callable[[], Awaitable[T]],
+    discard: Callable[[T], None] | None = None,
+) -> T:
+    settings = get_settings()
+    loop = asyncio.get_running_loop()
+    budget = _stage_deadline(stage)
+    deadline = loop.time() + budget
+    stats = _stage_stats.setdefault(stage, StageStats())
+    stats.calls += 1
+    attempt = 0
+    while True:
+        try:
+            result = await hedged_call(
+                factory, _hedge_delay(stage), deadline - loop.time(), discard
+            )
+        except DeadlineExceededError as exc:
+            stats.deadline_exceeded += 1
+            raise TimeoutError(
+                f"LLM {stage} call exceeded its {budget:.0f}s deadline"
+            ) from exc
+        except Exception as exc:
+            if not _is_transient(exc):
+                stats.failures += 1
+                raise
+            delay = min(
+                settings.llm_retry_base_seconds * 2**attempt,
+                settings.llm_retry_max_seconds,
+            ) * random.uniform(0.5, 1.0)
+            if attempt >= settings.llm_max_retries or loop.time() + delay >= deadline:
+                stats.failures += 1
+                raise
+            attempt += 1
+            stats.retries += 1
+            logger.warning(
+                "LLM %s call failed (%s), retry %d in %.1fs", stage, exc, attempt, delay
+            )
+            await asyncio.sleep(delay)
+            continue
+        _stage_latencies.setdefault(stage, LatencyTracker()).record(result.latency)
+        if result.hedged:
+            stats.hedges_fired += 1
+        if result.hedge_won:
+            stats.hedges_won += 1
+        return result.value
+
+
+def _response_text(response: types.GenerateContentResponse) -> str:
+    return response.text or ""
+
+
+def _finish_reason(response: types.GenerateContentResponse) -> str | None:
+    if not response.candidates:
+        return None
+    return response.candidates[0].finish_reason
+
+
+class _ResponseStream:
+    # The SDK reads streamed responses with blocking I/O, so each read runs on
+    # the blocking-I/O pool instead of the event loop.
+    def __init__(self, responses: Iterator[types.GenerateContentResponse]) -> None:
+        self._responses = responses
+        self._read: asyncio.Future[types.GenerateContentResponse | None] | None = None
+
+    async def next(self) -> types.GenerateContentResponse | None:
+        self._read = asyncio.ensure_future(run_blocking(next, self._responses, None))
+        return await asyncio.shield(self._read)
+
+    def _close_after(self, read: asyncio.Future) -> None:
+        if not read.cancelled():
+            read.exception()
+        self._responses.close()
+
+    def close(self) -> None:
+        # A read still running on a worker thread owns the generator until it
+        # returns, so closing waits for it.
+        if self._read is not None and not self._read.done():
+            self._read.add_done_callback(self._close_after)
+        else:
+            self._responses.close()
+
+
+def _cache_for(
+    config: LLMProfile, prompt: str, bypass_cache: bool
+) -> tuple[LLMCacheBackend | None, str]:
+    if bypass_cache or get_settings().llm_cache_bypass:
+        return None, ""
+    cache = get_llm_cache()
+    if cache is None:
+        return None, ""
+    return cache, llm_cache_key(
+        config.model, config.temperature, config.max_output_tokens, prompt
+    )
+
+
+async def _cache_put(
+    cache: LLMCacheBackend,
+    key: str,
+    text: str,
+    finish_reason: str | None,
+    validate: Callable[[str], bool] | None,
+) -> None:
+    if not text.strip() or finish_reason in _UNCACHEABLE_FINISH_REASONS:
+        return
+    if validate is not None and not validate(text):
+        return
+    await run_blocking(cache.set, key, text)
+
+
+async def ainvoke_text(
+    prompt: str,
+    profile: str,
+    bypass_cache: bool = False,
+    validate: Callable[[str], bool] | None = None,
+) -> str:
+    config = _profile_config(profile)
+    cache, key = _cache_for(config, prompt, bypass_cache)
+    if cache is not None:
+        cached = await run_blocking(cache.get, key)
+        if cached is not None:
+            return cached
+
+    async def _invoke() -> types.GenerateContentResponse:
+        return await get_llm_client(profile).aio.models.generate_content(
+            model=config.model,
+            contents=[prompt],
+            config=_generation_config(config),
+        )
+
+    response = await call_with_deadline(profile, _invoke)
+    text = _response_text(response)
+    if cache is not None:
+        await _cache_put(cache, key, text, _finish_reason(response), validate)
+    return text
+
+
+async def astream_text(
+    prompt: str,
+    profile: str,
+    bypass_cache: bool = False,
+    validate: Callable[[str], bool] | None = None,
+) -> AsyncIterator[str]:
+    config = _profile_config(profile)
+    cache, key = _cache_for(config, prompt, bypass_cache)
+    if cache is not None:
+        cached = await run_blocking(cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+
+    # Hedging and retries apply until the first chunk arrives; after that the
+    # winning stream is read to the end within the remaining deadline.
+    async def _open_stream() -> (
+        tuple[types.GenerateContentResponse | None, _ResponseStream]
+    ):
+        stream = _ResponseStream(
+            get_llm_client(profile).models.generate_content_stream(
+                model=config.model,
+                contents=[prompt],
+                config=_generation_config(config),
+            )
+        )
+        try:
+            first = await stream.next()
+        except BaseException:
+            stream.close()
+            raise
+        return first, stream
+
+    def _discard_stream(
+        opened: tuple[types.GenerateContentResponse | None, _ResponseStream],
+    ) -> None:
+        opened[1].close()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _stage_deadline(profile)
+    chunk, stream = await call_with_deadline(profile, _open_stream, _discard_stream)
+    chunks: list[str] = []
+    finish_reason: str | None = None
+    try:
+        while chunk is not None:
+            finish_reason = _finish_reason(chunk) or finish_reason
+            text = _response_text(chunk)
+            chunks.append(text)
+            yield text
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"LLM {profile} stream exceeded its deadline")
+            chunk = await asyncio.wait_for(stream.next(), remaining)
+    finally:
+        stream.close()
+    if cache is not None:
+        await _cache_put(cache, key, "".join(chunks), finish_reason, validate)
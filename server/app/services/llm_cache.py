@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Protocol
+
+
+def llm_cache_key(
+    model: str, temperature: float, max_output_tokens: int | None, prompt: str
+) -> str:
+    source = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "prompt": prompt,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+class LLMCacheBackend(Protocol):
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str) -> None: ...
+
+    def stats(self) -> dict[str, Any]: ...
+
+
+class MemoryLLMCache:
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._max_entries = max(max_entries, 1)
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self._ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+        }
+
+
+class SqliteLLMCache:
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._max_entries = max(max_entries, 1)
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self._ttl_seconds:
+                if row is not None:
+                    self._connection.execute(
+                        "DELETE FROM llm_cache WHERE key = ?", (key,)
+                    )
+                    self._connection.commit()
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._connection.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (now - self._ttl_seconds,),
+            )
+            deleted = self._connection.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self._max_entries,),
+            ).rowcount
+            self._connection.commit()
+            self.evictions += max(deleted, 0)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            (entries,) = self._connection.execute(
+                "SELECT COUNT(*) FROM llm_cache"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "max_entries": self._max_entries,
+        }
@@ -0,0 +1,262 @@
+import html as html_lib
+import re
+
+import markdown as markdown_lib
+
+from app.schemas.manual import IllustrationImage
+
+# Keep in sync with the .manual-image rule below; images are downsampled to fit.
+MANUAL_IMAGE_MAX_WIDTH_MM = 160
+MANUAL_IMAGE_MAX_HEIGHT_MM = 90
+
+MANUAL_CSS = """
+@page { size: A4; margin: 18mm 14mm; }
+body {
+  font-family: "Noto Sans CJK JP", "Noto Sans JP", sans-serif;
+  font-size: 11pt;
+  line-height: 1.7;
+  color: #222;
+  margin: 0;
+}
+h1, h2, h3 { page-break-after: avoid; break-after: avoid; line-height: 1.4; }
+h1 { font-size: 20pt; margin: 0 0 6mm; }
+h2 {
+  font-size: 15pt;
+  margin: 0 0 4mm;
+  padding-bottom: 1.5mm;
+  border-bottom: 1px solid #999;
+}
+h3 { font-size: 12.5pt; margin: 5mm 0 2mm; }
+p { margin: 0 0 3mm; }
+ul, ol { margin: 0 0 3mm; padding-left: 6mm; }
+table { width: 100%; border-collapse: collapse; margin: 0 0 4mm; }
+th, td {
+  border: 1px solid #999;
+  padding: 1.5mm 2mm;
+  text-align: left;
+  vertical-align: top;
+}
+th { background: #f2f2f2; }
+p, li, table, section { page-break-inside: avoid; break-inside: avoid; }
+section { margin-bottom: 12mm; }
+.manual-image {
+  width: 100%;
+  max-width: 160mm;
+  max-height: 90mm;
+  height: auto;
+  object-fit: contain;
+  border: none;
+}
+.image-block img { max-width: 160mm !important; max-height: 90mm !important; }
+.image-block { margin: 6mm 0; display: flex; justify-content: center; }
+.cover {
+  min-height: 240mm;
+  display: flex;
+  flex-direction: column;
+  justify-content: space-between;
+  margin-bottom: 0;
+  page-break-after: always;
+}
+.cover-title { text-align: center; margin-top: 40mm; }
+.cover-title h1 { font-size: 26pt; line-height: 1.5; }
+.cover-meta { text-align: center; margin-bottom: 10mm; }
+.cover-meta p { margin: 0 0 2mm; font-size: 12pt; }
+""".strip()
+
+_MARKDOWN_EXTENSIONS = ["tables", "sane_lists", "fenced_code"]
+
+_SECTION_HEADING_RE = re.compile(r"^#{1,2}\s+\S")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_IMAGE_RE = re.compile(r"!\[(?P<alt>[^\]]*)\]\((?P<url>[^)\s]+)(?:\s+\"[^\"]*\")?\)")
+_EMPTY_LINE_RE = re.compile(r"^\s*(?:[-*+>]|\d+\.)?\s*$")
+_ILLUSTRATION_SCHEME = "illustration://"
+_SECTION_BLOCK_RE = re.compile(
+    r'<section class="manual-section" id="section-\d+">.*?</section>', re.DOTALL
+)
+_SECTION_ID_RE = re.compile(r'id="section-\d+"')
+_LIST_ITEM_RE = re.compile(r"^(?P<indent> *)(?P<rest>(?:[-*+]|\d+[.)])\s.*)$")
+_LIST_INDENT = 4
+
+
+def split_markdown_sections(markdown: str) -> list[str]:
+    sections: list[list[str]] = []
+    current: list[str] = []
+    in_fence = False
+    for line in markdown.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and _SECTION_HEADING_RE.match(line):
+            if any(item.strip() for item in current):
+                sections.append(current)
+            current = []
+        current.append(line)
+    if any(item.strip() for item in current):
+        sections.append(current)
+    return ["\n".join(lines).strip() for lines in sections]
+
+
+def section_id(index: int) -> str:
+    return f"section-{index + 1}"
+
+
+def _resolve_image_url(url: str, illustrations: dict[str, str]) -> str | None:
+    if url.startswith(_ILLUSTRATION_SCHEME):
+        return illustrations.get(url[len(_ILLUSTRATION_SCHEME) :])
+    return url
+
+
+def _image_block(url: str, alt: str) -> str:
+    return (
+        '<div class="image-block">'
+        f'<img class="manual-image" src="{html_lib.escape(url, quote=True)}" '
+        f'alt="{html_lib.escape(alt, quote=True)}">'
+        "</div>"
+    )
+
+
+def _extract_image_blocks(markdown: str, illustrations: dict[str, str]) -> str:
+    lines: list[str] = []
+    in_fence = False
+    for line in markdown.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        matches = [] if in_fence else list(_IMAGE_RE.finditer(line))
+        if not matches:
+            lines.append(line)
+            continue
+        remaining = _IMAGE_RE.sub("", line)
+        if not _EMPTY_LINE_RE.match(remaining):
+            lines.append(remaining.rstrip())
+        for match in matches:
+            url = _resolve_image_url(match.group("url"), illustrations)
+            if not url:
+                continue
+            lines.extend(["", _image_block(url, match.group("alt").strip()), ""])
+    return "\n".join(lines)
+
+
+def _normalize_list_indent(markdown: str) -> str:
+    # python-markdown nests lists only at four spaces; LLMs usually emit two.
+    lines: list[str] = []
+    levels: list[int] = []
+    in_fence = False
+    for line in markdown.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+            lines.append(line)
+            continue
+        if in_fence or not line.strip():
+            lines.append(line)
+            continue
+        expanded = line.expandtabs(_LIST_INDENT)
+        indent = len(expanded) - len(expanded.lstrip(" "))
+        item = _LIST_ITEM_RE.match(expanded)
+        if item:
+            while levels and levels[-1] > indent:
+                levels.pop()
+            if not levels or levels[-1] < indent:
+                levels.append(indent)
+            depth = len(levels) - 1
+            lines.append(" " * (_LIST_INDENT * depth) + item.group("rest"))
+        elif indent and levels:
+            depth = sum(1 for level in levels if level < indent)
+            lines.append(" " * (_LIST_INDENT * depth) + expanded.lstrip(" "))
+        else:
+            if not indent:
+                levels = []
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def render_section_html(
+    markdown: str, index: int, illustration_images: list[IllustrationImage]
+) -> str:
+    illustrations = {item["id"]: item["public_url"] for item in illustration_images}
+    source = _normalize_list_indent(_extract_image_blocks(markdown, illustrations))
+    body = markdown_lib.markdown(source, extensions=_MARKDOWN_EXTENSIONS)
+    return (
+        f'<section class="manual-section" id="{section_id(index)}">\n{body}\n</section>'
+    )
+
+
+def _render_cover(name: str, author: str, issued_on: str) -> str:
+    if name:
+        title = f"{html_lib.escape(name)}<br>防災マニュアル"
+    else:
+        title = "防災マニュアル"
+    meta = [f"<p>{html_lib.escape(issued_on)}</p>"] if issued_on else []
+    if author:
+        meta.append(f"<p>{html_lib.escape(author)}</p>")
+    return (
+        '<section class="cover">\n'
+        f'<div class="cover-title"><h1>{title}</h1></div>\n'
+        f'<div class="cover-meta">{"".join(meta)}</div>\n'
+        "</section>"
+    )
+
+
+def render_manual_html(
+    markdown: str,
+    illustration_images: list[IllustrationImage],
+    manual_title: str,
+    name: str,
+    author: str,
+    issued_on: str,
+) -> str:
+    sections = [
+        render_section_html(section, index, illustration_images)
+        for index, section in enumerate(split_markdown_sections(markdown))
+    ]
+    body = "\n".join([_render_cover(name, author, issued_on), *sections])
+    return (
+        "<!doctype html>\n"
+        '<html lang="ja">\n'
+        "<head>\n"
+        '<meta charset="utf-8">\n'
+        f"<title>{html_lib.escape(manual_title)}</title>\n"
+        f"<style>\n{MANUAL_CSS}\n</style>\n"
+        "</head>\n"
+        f"<body>\n{body}\n</body>\n"
+        "</html>\n"
+    )
+
+
+def count_manual_sections(html: str) -> int:
+    return len(_SECTION_BLOCK_RE.findall(html))
+
+
+def _rename_section(block: str, index: int) -> str:
+    return _SECTION_ID_RE.sub(f'id="{section_id(index)}"', block, count=1)
+
+
+def patch_manual_html(
+    html: str,
+    markdown_sections: list[str],
+    replacements: dict[int, str],
+    illustration_images: list[IllustrationImage],
+) -> tuple[str, str] | None:
+    blocks = list(_SECTION_BLOCK_RE.finditer(html))
+    if not blocks or len(blocks) != len(markdown_sections):
+        return None
+
+    new_sections: list[str] = []
+    pieces: list[str] = [html[: blocks[0].start()]]
+    for index, block in enumerate(blocks):
+        if index in replacements:
+            rendered: list[str] = []
+            for part in split_markdown_sections(replacements[index]):
+                rendered.append(
+                    render_section_html(part, len(new_sections), illustration_images)
+                )
+                new_sections.append(part)
+            pieces.append("\n".join(rendered))
+        else:
+            pieces.append(_rename_section(block.group(0), len(new_sections)))
+            new_sections.append(markdown_sections[index])
+        next_start = blocks[index + 1].start() if index + 1 < len(blocks) else None
+        pieces.append(html[block.end() : next_start])
+
+    markdown = "\n\n".join(new_sections)
+    if split_markdown_sections(markdown) != new_sections:
+        return None
+    return "".join(pieces), markdown
@@ -3,14 +3,23 @@ from google import genai
 from app.core.config import get_settings
 from app.utils.bytes import coerce_bytes
 
+_client: genai.Client | None = None
 
-def generate_illustration(prompt: str) -> tuple[bytes, str]:
-    settings = get_settings()
-    if not settings.gemini_api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
 
-    client = genai.Client(api_key=settings.gemini_api_key)
-    response = client.models.generate_content(
+def get_genai_client() -> genai.Client:
+    global _client
+    if _client is None:
+        settings = get_settings()
+        if not settings.gemini_api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set")
+        _client = genai.Client(api_key=settings.gemini_api_key)
+    return _client
+
+
+async def generate_illustration(prompt: str) -> tuple[bytes, str]:
+    settings = get_settings()
+    client = get_genai_client()
+    response = await client.aio.models.generate_content(
         model=settings.nanobanana_model,
         contents=[prompt],
     )
@@ -1,22 +1,80 @@
+import io
 import json
+import logging
+import re
+import time
+import unicodedata
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
 from typing import Any
 
 from google.cloud import storage, vision
+from pypdf import PdfReader, PdfWriter
 
 from app.core.config import get_settings
+from app.services.storage import delete_prefix
 
+logger = logging.getLogger(__name__)
 
-def _extract_text_from_vision_output(payload: dict[str, Any]) -> str:
-    texts = payload.get("responses") or []
-    lines: list[str] = []
-    for response in texts:
+# Pages are joined with form feeds so reference cleaning can spot running
+# headers and footers per page.
+PAGE_SEPARATOR = "\f"
+
+_OCR_TIMEOUT_SECONDS = 180
+_OCR_POLL_SECONDS = 1.0
+_OCR_CANCEL_GRACE_SECONDS = 10
+_SHARD_DOWNLOAD_WORKERS = 4
+_OCR_PRIORITY_KEYWORDS = ("防災", "避難", "マンション", "備蓄", "災害", "連絡")
+# Vision names each shard after the page range it covers: output-6-to-10.json.
+_SHARD_NAME_RE = re.compile(r"output-(\d+)-to-\d+\.json$")
+
+
+def _extract_pages_from_vision_output(
+    payload: dict[str, Any], first_page: int = 1
+) -> dict[int, str]:
+    pages: dict[int, str] = {}
+    responses = payload.get("responses") or []
+    for position, response in enumerate(responses, start=first_page):
         annotation = response.get("fullTextAnnotation") or {}
-        if not annotation:
-            continue
         text = annotation.get("text") or ""
-        if text:
-            lines.append(text)
-    return "\n".join(lines)
+        if not text:
+            continue
+        page_number = (response.get("context") or {}).get("pageNumber") or position
+        pages[int(page_number)] = text
+    return pages
+
+
+def _open_pdf(file_bytes: bytes) -> PdfReader:
+    reader = PdfReader(io.BytesIO(file_bytes))
+    # Many published PDFs are encrypted only to restrict editing.
+    if reader.is_encrypted:
+        reader.decrypt("")
+    return reader
+
+
+def _extract_local_pages(file_bytes: bytes) -> list[str]:
+    reader = _open_pdf(file_bytes)
+    pages: list[str] = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception:
+            pages.append("")
+    return pages
+
+
+def _is_usable_page_text(text: str) -> bool:
+    settings = get_settings()
+    visible = [char for char in text if not char.isspace()]
+    if len(visible) < settings.pdf_text_min_chars:
+        return False
+    # Broken font mappings surface as replacement or private-use characters.
+    readable = sum(
+        1
+        for char in visible
+        if char != "\ufffd" and unicodedata.category(char) not in {"Co", "Cc", "Cn"}
+    )
+    return readable / len(visible) >= settings.pdf_text_min_readable_ratio
 
 
 def _detect_text_from_image(image_bytes: bytes) -> str:
@@ -28,38 +86,194 @@ def _detect_text_from_image(image_bytes: bytes) -> str:
     return response.full_text_annotation.text or ""
 
 
-def _detect_text_from_pdf(file_bytes: bytes, filename: str, gcs_uri: str) -> str:
+def _select_ocr_pages(pages: list[str], missing: list[int]) -> list[int]:
+    limit = get_settings().ocr_max_pages
+    if len(missing) <= limit:
+        return missing
+    # Pages with a weak text layer that still mentions the topic go first.
+    ranked = sorted(
+        missing,
+        key=lambda number: (
+            -sum(keyword in pages[number - 1] for keyword in _OCR_PRIORITY_KEYWORDS),
+            number,
+        ),
+    )
+    return sorted(ranked[:limit])
+
+
+def _subset_pdf(file_bytes: bytes, page_numbers: list[int]) -> bytes:
+    reader = _open_pdf(file_bytes)
+    writer = PdfWriter()
+    for number in page_numbers:
+        writer.add_page(reader.pages[number - 1])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _download_shard(blob: storage.Blob) -> dict[int, str]:
+    match = _SHARD_NAME_RE.search(blob.name)
+    return _extract_pages_from_vision_output(
+        json.loads(blob.download_as_bytes()), int(match.group(1)) if match else 1
+    )
+
+
+def _cancel_operation(operation: Any) -> bool:
+    try:
+        operation.cancel()
+    except Exception:
+        logger.warning("Could not cancel the Vision OCR operation", exc_info=True)
+        return False
+    deadline = time.monotonic() + _OCR_CANCEL_GRACE_SECONDS
+    while not operation.done():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(_OCR_POLL_SECONDS)
+    return True
+
+
+def _ocr_pdf_pages(
+    file_bytes: bytes,
+    filename: str,
+    gcs_uri: str,
+    page_numbers: list[int] | None = None,
+) -> dict[int, str]:
     settings = get_settings()
     if not settings.gcs_bucket:
         raise RuntimeError("GCS_BUCKET is not set")
 
-    client = vision.ImageAnnotatorClient()
-    gcs_source = vision.GcsSource(uri=gcs_uri)
-    input_config = vision.InputConfig(
-        gcs_source=gcs_source, mime_type="application/pdf"
-    )
-    job_id = filename.replace("/", "_")
-    output_uri = f"gs://{settings.gcs_bucket}/{settings.gcs_output_prefix}{job_id}/"
-    gcs_destination = vision.GcsDestination(uri=output_uri)
-    output_config = vision.OutputConfig(gcs_destination=gcs_destination, batch_size=2)
-    request = vision.AsyncAnnotateFileRequest(
-        features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
-        input_config=input_config,
-        output_config=output_config,
-    )
-    operation = client.async_batch_annotate_files(requests=[request])
-    operation.result(timeout=180)
-
     storage_client = storage.Client()
     bucket = storage_client.bucket(settings.gcs_bucket)
-    prefix = f"{settings.gcs_output_prefix}{job_id}/"
-    blobs = list(bucket.list_blobs(prefix=prefix))
-    extracted_texts: list[str] = []
-    for blob in blobs:
-        content = blob.download_as_bytes()
-        payload = json.loads(content)
-        extracted_texts.append(_extract_text_from_vision_output(payload))
-    return "\n".join(text for text in extracted_texts if text)
+    job_id = f"{filename.replace('/', '_')}-{uuid.uuid4().hex[:8]}"
+    job_prefix = f"{settings.gcs_output_prefix}{job_id}/"
+    output_prefix = f"{job_prefix}output/"
+    # Without a subset the whole file goes to Vision; stop once enough leading
+    # pages are back so long documents do not cost more than the page cap.
+    max_pages = settings.ocr_max_pages
+    cancelled = False
+    try:
+        source_uri = gcs_uri
+        if page_numbers is not None:
+            try:
+                subset_bytes = _subset_pdf(file_bytes, page_numbers)
+            except Exception:
+                logger.warning(
+                    "Could not subset %s, OCR of the original", filename, exc_info=True
+                )
+                max_pages = max(page_numbers)
+                page_numbers = None
+            else:
+                subset = bucket.blob(f"{job_prefix}input.pdf")
+                subset.upload_from_string(subset_bytes, content_type="application/pdf")
+                source_uri = f"gs://{settings.gcs_bucket}/{subset.name}"
+
+        client = vision.ImageAnnotatorClient()
+        request = vision.AsyncAnnotateFileRequest(
+            features=[
+                vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+            ],
+            input_config=vision.InputConfig(
+                gcs_source=vision.GcsSource(uri=source_uri),
+                mime_type="application/pdf",
+            ),
+            output_config=vision.OutputConfig(
+                gcs_destination=vision.GcsDestination(
+                    uri=f"gs://{settings.gcs_bucket}/{output_prefix}"
+                ),
+                batch_size=settings.ocr_batch_size,
+            ),
+        )
+        operation = client.async_batch_annotate_files(requests=[request])
+
+        # Shards are parsed while the operation is still running, so the last
+        # one is the only download left once it finishes.
+        pages: dict[int, str] = {}
+        seen: set[str] = set()
+        deadline = time.monotonic() + _OCR_TIMEOUT_SECONDS
+        with ThreadPoolExecutor(max_workers=_SHARD_DOWNLOAD_WORKERS) as pool:
+            pending: set[Future[dict[int, str]]] = set()
+            while True:
+                finished = operation.done()
+                for blob in bucket.list_blobs(prefix=output_prefix):
+                    if blob.name not in seen:
+                        seen.add(blob.name)
+                        pending.add(pool.submit(_download_shard, blob))
+                if finished:
+                    break
+                if time.monotonic() >= deadline:
+                    cancelled = True
+                    raise TimeoutError(f"Vision OCR for {filename} timed out")
+                if not pending:
+                    time.sleep(_OCR_POLL_SECONDS)
+                    continue
+                done, pending = wait(pending, timeout=_OCR_POLL_SECONDS)
+                for future in done:
+                    pages.update(future.result())
+                if page_numbers is None and len(pages) >= max_pages:
+                    cancelled = True
+                    break
+            if not cancelled:
+                operation.result()
+            for future in as_completed(pending):
+                pages.update(future.result())
+    finally:
+        # A cancelled operation may still be writing shards; its output is only
+        # removed once Vision confirms the cancellation.
+        if cancelled and not _cancel_operation(operation):
+            logger.warning("Leaving %s in place for a running OCR job", job_prefix)
+        else:
+            try:
+                delete_prefix(settings.gcs_bucket, job_prefix)
+            except Exception:
+                logger.warning("Could not clean up %s", job_prefix, exc_info=True)
+
+    if page_numbers is None:
+        return {
+            number: pages[number] for number in sorted(pages) if number <= max_pages
+        }
+    return {
+        page_numbers[number - 1]: text
+        for number, text in pages.items()
+        if 0 < number <= len(page_numbers)
+    }
+
+
+def _detect_text_from_pdf(file_bytes: bytes, filename: str, gcs_uri: str) -> str:
+    try:
+        pages = _extract_local_pages(file_bytes)
+    except Exception:
+        logger.warning("Local text extraction failed for %s", filename, exc_info=True)
+        pages = []
+    missing = [
+        number
+        for number, text in enumerate(pages, start=1)
+        if not _is_usable_page_text(text)
+    ]
+    if pages and not missing:
+        return PAGE_SEPARATOR.join(pages)
+
+    if not pages:
+        ocr_pages = _ocr_pdf_pages(file_bytes, filename, gcs_uri)
+        return PAGE_SEPARATOR.join(ocr_pages[number] for number in sorted(ocr_pages))
+
+    selected = _select_ocr_pages(pages, missing)
+    logger.info(
+        "OCR needed for %s: %d of %d pages lack a usable text layer, %d selected",
+        filename,
+        len(missing),
+        len(pages),
+        len(selected),
+    )
+    ocr_pages = _ocr_pdf_pages(
+        file_bytes,
+        filename,
+        gcs_uri,
+        None if len(selected) == len(pages) else selected,
+    )
+    for number in selected:
+        if ocr_pages.get(number):
+            pages[number - 1] = ocr_pages[number]
+    return PAGE_SEPARATOR.join(pages)
 
 
 def detect_text_from_bytes(
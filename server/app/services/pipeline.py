@@ -0,0 +1,163 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.schemas.manual import IllustrationImage, IllustrationPrompt, InputImage
+from app.services.generate import (
+    generate_manual_html_from_markdown,
+    generate_manual_pdf,
+    stream_markdown_with_prompts,
+)
+from app.services.illustrations import IllustrationBatch, planned_illustration_images
+from app.services.renderer import RenderAsset
+from app.services.sessions import update_session
+from app.services.storage import upload_bytes
+from app.utils.concurrency import run_blocking
+from app.utils.dates import build_issued_on
+
+GENERATION_STAGES = ("markdown", "illustrations", "html", "pdf", "upload")
+
+StageCallback = Callable[[str], Awaitable[None]]
+MarkdownCallback = Callable[[str], Awaitable[None]]
+
+
+async def _notify(on_stage: StageCallback | None, stage: str) -> None:
+    if on_stage is not None:
+        await on_stage(stage)
+
+
+async def build_manual_artifacts(
+    session_id: str,
+    bucket: str,
+    markdown: str,
+    illustration_prompts: list[IllustrationPrompt],
+    manual_title: str,
+    name: str,
+    author: str,
+    issued_on: str,
+    render_assets: dict[str, RenderAsset],
+    on_stage: StageCallback | None = None,
+    batch: IllustrationBatch | None = None,
+) -> tuple[str, str, list[IllustrationImage], bytes]:
+    if batch is None:
+        batch = IllustrationBatch(session_id, bucket)
+    planned = await planned_illustration_images(
+        session_id, bucket, illustration_prompts
+    )
+    await _notify(on_stage, "illustrations")
+    html_task = asyncio.create_task(
+        run_blocking(
+            generate_manual_html_from_markdown,
+            markdown,
+            planned,
+            manual_title,
+            name,
+            author,
+            issued_on,
+        )
+    )
+    images_task = asyncio.create_task(batch.collect(illustration_prompts))
+    try:
+        (html, markdown), (illustration_images, illustration_assets) = (
+            await asyncio.gather(html_task, images_task)
+        )
+    except BaseException:
+        html_task.cancel()
+        images_task.cancel()
+        raise
+
+    await _notify(on_stage, "html")
+    if [image["public_url"] for image in illustration_images] != [
+        image["public_url"] for image in planned
+    ]:
+        html, markdown = await run_blocking(
+            generate_manual_html_from_markdown,
+            markdown,
+            illustration_images,
+            manual_title,
+            name,
+            author,
+            issued_on,
+        )
+    await _notify(on_stage, "pdf")
+    pdf_bytes = await generate_manual_pdf(
+        html, {**render_assets, **illustration_assets}
+    )
+    return html, markdown, illustration_images, pdf_bytes
+
+
+async def run_generation(
+    session_id: str,
+    session: dict[str, Any],
+    bucket: str,
+    memo: str,
+    uploaded_images: list[InputImage],
+    render_assets: dict[str, RenderAsset],
+    on_stage: StageCallback | None = None,
+    on_markdown: MarkdownCallback | None = None,
+) -> None:
+    inputs = session.get("inputs") or {}
+    step1 = inputs.get("step1") or {}
+    name = ""
+    author = ""
+    if isinstance(step1, dict):
+        name = str(step1.get("name") or "").strip()
+        author = str(step1.get("author") or "").strip()
+    manual_title = f"{name} 防災マニュアル" if name else "防災マニュアル"
+
+    issued_on = build_issued_on()
+    await _notify(on_stage, "markdown")
+    batch = IllustrationBatch(session_id, bucket)
+    try:
+        markdown, illustration_prompts = await stream_markdown_with_prompts(
+            memo,
+            uploaded_images,
+            manual_title,
+            name,
+            author,
+            issued_on,
+            on_prompt=batch.submit,
+            on_markdown=on_markdown,
+        )
+        html, markdown, illustration_images, pdf_bytes = await build_manual_artifacts(
+            session_id,
+            bucket,
+            markdown,
+            illustration_prompts,
+            manual_title,
+            name,
+            author,
+            issued_on,
+            render_assets,
+            on_stage,
+            batch,
+        )
+    except BaseException:
+        batch.cancel()
+        raise
+
+    await _notify(on_stage, "upload")
+    blob_name = f"sessions/{session_id}/output/manual.pdf"
+    await run_blocking(upload_bytes, bucket, blob_name, pdf_bytes, "application/pdf")
+    await run_blocking(
+        update_session,
+        session_id,
+        {
+            "status": "done",
+            "pdf_blob_name": blob_name,
+            "inputs": {
+                "step2": {
+                    "memo": memo,
+                    "manual_title": manual_title,
+                    "name": name,
+                    "author": author,
+                    "issued_on": issued_on,
+                    "uploaded_images": uploaded_images,
+                    "illustration_prompts": illustration_prompts,
+                    "illustration_images": illustration_images,
+                },
+                "html": html,
+                "markdown": markdown,
+            },
+        },
+    )
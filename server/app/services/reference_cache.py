@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any
+
+from app.core.config import get_settings
+from app.services.search import official_manual_queries, search_official_manual
+from app.services.storage import download_bytes, upload_bytes
+from app.utils.concurrency import run_blocking
+from app.utils.text_index import normalize_text
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_CACHE_PREFIX = "reference_cache/"
+
+_inflight: dict[str, asyncio.Task[dict[str, Any] | None]] = {}
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+
+def _settle(key: str, task: asyncio.Task[dict[str, Any] | None]) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled() and task.exception() is not None:
+        _stats["errors"] += 1
+
+
+def reference_cache_key(
+    city: str | None, prefecture: str | None, queries: list[tuple[str, str]]
+) -> str:
+    source = json.dumps(
+        [
+            normalize_text(prefecture or ""),
+            normalize_text(city or ""),
+            [[scope, normalize_text(query)] for scope, query in queries],
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def reference_cache_blob_name(key: str, filename: str) -> str:
+    return f"{REFERENCE_CACHE_PREFIX}{key}/{filename}"
+
+
+def _entry_ttl(search: dict[str, Any] | None) -> int:
+    settings = get_settings()
+    # Misses and failed OCR runs are retried sooner than complete results.
+    if search and search.get("reference_text"):
+        return settings.reference_cache_ttl_seconds
+    return settings.reference_cache_negative_ttl_seconds
+
+
+def _load_entry(bucket: str, key: str) -> dict[str, Any] | None:
+    data = download_bytes(bucket, reference_cache_blob_name(key, "entry.json"))
+    if not data:
+        return None
+    try:
+        entry = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+    if float(entry.get("expires_at") or 0) <= time.time():
+        return None
+    return entry
+
+
+def _store_entry(
+    bucket: str,
+    key: str,
+    city: str | None,
+    prefecture: str | None,
+    search: dict[str, Any] | None,
+) -> None:
+    cached_at = time.time()
+    entry = {
+        "prefecture": prefecture,
+        "city": city,
+        "search": search,
+        "cached_at": cached_at,
+        "expires_at": cached_at + _entry_ttl(search),
+    }
+    upload_bytes(
+        bucket,
+        reference_cache_blob_name(key, "entry.json"),
+        json.dumps(entry, ensure_ascii=False).encode("utf-8"),
+        "application/json",
+    )
+
+
+async def _lookup(
+    bucket: str,
+    key: str,
+    city: str | None,
+    prefecture: str | None,
+    place: dict[str, Any] | None,
+) -> dict[str, Any] | None:
+    try:
+        entry = await run_blocking(_load_entry, bucket, key)
+    except Exception:
+        logger.warning("Reference cache read failed for %s", key, exc_info=True)
+        entry = None
+    if entry is not None:
+        _stats["hits"] += 1
+        return entry.get("search")
+    _stats["misses"] += 1
+    search = await search_official_manual(
+        city, prefecture, place, reference_cache_blob_name(key, "manual.pdf")
+    )
+    try:
+        await run_blocking(_store_entry, bucket, key, city, prefecture, search)
+    except Exception:
+        _stats["errors"] += 1
+        logger.warning("Reference cache write failed for %s", key, exc_info=True)
+    return search
+
+
+async def find_official_manual(
+    city: str | None, prefecture: str | None, place: dict[str, Any] | None = None
+) -> dict[str, Any] | None:
+    bucket = get_settings().gcs_bucket
+    if not bucket:
+        return await search_official_manual(city, prefecture, place)
+    key = reference_cache_key(
+        city, prefecture, official_manual_queries(city, prefecture, place)
+    )
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_lookup(bucket, key, city, prefecture, place))
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _settle(key, done))
+    else:
+        _stats["coalesced"] += 1
+    # A caller that goes away must not cancel the lookup other sessions await.
+    return await asyncio.shield(task)
+
+
+def reference_cache_stats() -> dict[str, int]:
+    return {**_stats, "inflight": len(_inflight)}
@@ -0,0 +1,237 @@
+import json
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Any
+
+from app.core.config import get_settings
+from app.services.storage import download_bytes, upload_bytes
+from app.utils.concurrency import run_blocking
+from app.utils.text_index import TfidfIndex
+
+logger = logging.getLogger(__name__)
+
+_PAGE_NUMBER_RE = re.compile(
+    r"^(?:[-‐–—―ー]\s*)?(?:p\.?\s*|page\s*)?(\d{1,3})(?:\s*/\s*\d{1,3})?"
+    r"(?:\s*[-‐–—―ー])?(?:\s*ページ)?$",
+    re.IGNORECASE,
+)
+_HEADER_MAX_CHARS = 40
+_MIN_REPEATS = 3
+_QUERY_WEIGHT = 0.7
+_LOADED_INDEX_LIMIT = 32
+
+
+def _normalize_line(line: str) -> str:
+    return unicodedata.normalize("NFKC", line).strip()
+
+
+def _page_number_lines(pages: list[list[str]]) -> set[tuple[int, int]]:
+    # A bare number is only a page number at the top or bottom of a page, or
+    # when it continues a run of consecutive numbers; emergency numbers such as
+    # 119 in the body text are kept.
+    found: set[tuple[int, int]] = set()
+    runs: dict[int, list[tuple[int, int]]] = {}
+    for page_index, page in enumerate(pages):
+        filled = [index for index, line in enumerate(page) if line]
+        edges = {filled[0], filled[-1]} if filled and len(pages) > 1 else set()
+        for line_index in filled:
+            match = _PAGE_NUMBER_RE.match(page[line_index])
+            if match is None:
+                continue
+            position = (page_index, line_index)
+            if line_index in edges:
+                found.add(position)
+            number = int(match.group(1))
+            run = runs.pop(number - 1, [])
+            run.append(position)
+            runs[number] = run
+    for run in runs.values():
+        if len(run) >= _MIN_REPEATS:
+            found.update(run)
+    return found
+
+
+def clean_reference_text(text: str) -> str:
+    pages = [
+        [_normalize_line(line) for line in page.splitlines()]
+        for page in text.split("\f")
+    ]
+    # Headers and footers repeat once per page; without page breaks in the OCR
+    # output, short lines that recur several times are treated the same way.
+    if len(pages) >= _MIN_REPEATS:
+        counts = Counter(line for page in pages for line in set(page) if line)
+        threshold = max(_MIN_REPEATS, len(pages) // 2)
+    else:
+        counts = Counter(line for page in pages for line in page if line)
+        threshold = _MIN_REPEATS + 1
+    repeated = {
+        line
+        for line, count in counts.items()
+        if count >= threshold
+        and len(line) <= _HEADER_MAX_CHARS
+        and not _PAGE_NUMBER_RE.match(line)
+    }
+    page_numbers = _page_number_lines(pages)
+    kept: list[str] = []
+    for page_index, page in enumerate(pages):
+        for line_index, line in enumerate(page):
+            if not line or line in repeated or (page_index, line_index) in page_numbers:
+                continue
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def chunk_reference_text(text: str, chunk_chars: int, overlap_chars: int) -> list[str]:
+    lines: list[str] = []
+    for line in text.splitlines():
+        for start in range(0, len(line), chunk_chars):
+            lines.append(line[start : start + chunk_chars])
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in lines:
+        if current and size + len(line) > chunk_chars:
+            chunks.append("\n".join(current))
+            carried: list[str] = []
+            carried_size = 0
+            for previous in reversed(current):
+                if carried_size + len(previous) > overlap_chars:
+                    break
+                carried.insert(0, previous)
+                carried_size += len(previous)
+            current, size = carried, carried_size
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _dot(left: dict[str, float], right: dict[str, float]) -> float:
+    if len(left) > len(right):
+        left, right = right, left
+    return sum(value * right.get(gram, 0.0) for gram, value in left.items())
+
+
+class ReferenceIndex:
+    def __init__(self, chunks: list[str], index: TfidfIndex) -> None:
+        self.chunks = chunks
+        self.index = index
+
+    @classmethod
+    def build(cls, reference_text: str) -> "ReferenceIndex":
+        settings = get_settings()
+        chunks = chunk_reference_text(
+            clean_reference_text(reference_text),
+            settings.reference_chunk_chars,
+            settings.reference_chunk_overlap_chars,
+        )
+        return cls(chunks, TfidfIndex.build(chunks))
+
+    def select(self, query: str, covered: list[str], top_k: int) -> list[str]:
+        if not self.chunks or top_k <= 0:
+            return []
+        query_vector = self.index.vectorize(query) if query.strip() else {}
+        covered_vectors = [self.index.vectorize(text) for text in covered if text]
+        scored: list[tuple[float, int]] = []
+        for position, vector in enumerate(self.index.vectors):
+            coverage = max(
+                (_dot(vector, other) for other in covered_vectors), default=0
+            )
+            gap = 1.0 - coverage
+            if query_vector:
+                score = (
+                    _QUERY_WEIGHT * _dot(vector, query_vector)
+                    + (1 - _QUERY_WEIGHT) * gap
+                )
+            else:
+                score = gap
+            scored.append((score, position))
+        scored.sort(reverse=True)
+        positions = sorted(position for _, position in scored[:top_k])
+        return [self.chunks[position] for position in positions]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"chunks": self.chunks, "index": self.index.to_dict()}
+
+    @classmethod
+    def from_dict(cls, payload: dict[str, Any]) -> "ReferenceIndex":
+        return cls(
+            payload.get("chunks") or [],
+            TfidfIndex.from_dict(payload.get("index") or {}),
+        )
+
+
+def reference_index_blob_name(session_id: str) -> str:
+    return f"sessions/{session_id}/search/reference_index.json"
+
+
+_loaded: OrderedDict[str, ReferenceIndex] = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def _remember(blob_name: str, reference: ReferenceIndex) -> None:
+    with _loaded_lock:
+        _loaded[blob_name] = reference
+        _loaded.move_to_end(blob_name)
+        while len(_loaded) > _LOADED_INDEX_LIMIT:
+            _loaded.popitem(last=False)
+
+
+def save_reference_index(
+    bucket: str, session_id: str, reference: ReferenceIndex
+) -> dict[str, Any]:
+    blob_name = reference_index_blob_name(session_id)
+    upload_bytes(
+        bucket,
+        blob_name,
+        json.dumps(reference.to_dict(), ensure_ascii=False).encode("utf-8"),
+        "application/json",
+    )
+    _remember(blob_name, reference)
+    return {"blob_name": blob_name, "chunk_count": len(reference.chunks)}
+
+
+def load_reference_index(bucket: str, blob_name: str) -> ReferenceIndex | None:
+    with _loaded_lock:
+        reference = _loaded.get(blob_name)
+        if reference is not None:
+            _loaded.move_to_end(blob_name)
+            return reference
+    data = download_bytes(bucket, blob_name)
+    if not data:
+        return None
+    reference = ReferenceIndex.from_dict(json.loads(data))
+    _remember(blob_name, reference)
+    return reference
+
+
+async def prepare_search_reference(
+    session_id: str, search: dict[str, Any] | None
+) -> tuple[dict[str, Any] | None, ReferenceIndex | None]:
+    bucket = get_settings().gcs_bucket
+    if not search or not bucket:
+        return search, None
+    try:
+        pointer = search.get("reference_index")
+        if isinstance(pointer, dict) and pointer.get("blob_name"):
+            reference = await run_blocking(
+                load_reference_index, bucket, pointer["blob_name"]
+            )
+            return search, reference
+        reference_text = search.get("reference_text")
+        if not isinstance(reference_text, str) or not reference_text.strip():
+            return search, None
+        reference = await run_blocking(ReferenceIndex.build, reference_text)
+        pointer = await run_blocking(
+            save_reference_index, bucket, session_id, reference
+        )
+    except Exception:
+        logger.warning("Reference index unavailable for %s", session_id, exc_info=True)
+        return search, None
+    state = {key: value for key, value in search.items() if key != "reference_text"}
+    state["reference_index"] = pointer
+    return state, reference
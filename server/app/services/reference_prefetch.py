@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from typing import Any
+
+from app.services.reference_cache import find_official_manual
+from app.services.reference_index import prepare_search_reference
+from app.services.sessions import update_session
+from app.utils.concurrency import run_blocking
+
+logger = logging.getLogger(__name__)
+
+_tasks: dict[str, asyncio.Task[dict[str, Any] | None]] = {}
+
+
+def _forget_task(session_id: str, task: asyncio.Task) -> None:
+    if _tasks.get(session_id) is task:
+        del _tasks[session_id]
+
+
+async def _prefetch(session_id: str, place: dict[str, Any]) -> dict[str, Any] | None:
+    try:
+        search = await find_official_manual(
+            place.get("city"), place.get("prefecture"), place
+        )
+        search, _ = await prepare_search_reference(session_id, search)
+    except Exception as exc:
+        logger.warning("Reference prefetch for %s failed: %s", session_id, exc)
+        await run_blocking(
+            update_session,
+            session_id,
+            {"reference": {"status": "failed", "error": str(exc)}},
+        )
+        return None
+    record = {"status": "ready", "search": search}
+    await run_blocking(update_session, session_id, {"reference": record})
+    return record
+
+
+def start_reference_prefetch(session_id: str, place: dict[str, Any]) -> None:
+    if session_id in _tasks:
+        return
+    task = asyncio.create_task(_prefetch(session_id, place))
+    _tasks[session_id] = task
+    task.add_done_callback(lambda done: _forget_task(session_id, done))
+
+
+def cancel_reference_prefetch(session_id: str) -> None:
+    task = _tasks.pop(session_id, None)
+    if task is not None:
+        task.cancel()
+
+
+async def prefetched_reference(
+    session_id: str, session: dict[str, Any]
+) -> dict[str, Any] | None:
+    task = _tasks.get(session_id)
+    if task is not None:
+        return await asyncio.shield(task)
+    record = session.get("reference")
+    if isinstance(record, dict) and record.get("status") == "ready":
+        return record
+    return None
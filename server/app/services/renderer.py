@@ -0,0 +1,162 @@
+import asyncio
+import urllib.parse
+
+from playwright.async_api import Browser, Page, Playwright, Route, async_playwright
+
+from app.core.config import get_settings
+
+_PDF_MARGIN = {"top": "18mm", "bottom": "18mm", "left": "14mm", "right": "14mm"}
+
+_IMAGES_READY_SCRIPT = """
+() => Promise.all([
+  document.fonts.ready,
+  ...Array.from(document.images).map((img) =>
+    img.complete
+      ? Promise.resolve()
+      : new Promise((resolve) => {
+          img.addEventListener("load", resolve, { once: true });
+          img.addEventListener("error", resolve, { once: true });
+        })
+  ),
+]).then(() => true)
+"""
+
+RenderAsset = tuple[bytes, str]
+
+
+class ManualRenderer:
+    def __init__(self, pool_size: int) -> None:
+        self._pool_size = max(pool_size, 1)
+        self._slots = asyncio.Semaphore(self._pool_size)
+        self._lock = asyncio.Lock()
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+        self._idle_pages: list[Page] = []
+
+    def is_saturated(self) -> bool:
+        return self._slots.locked()
+
+    def is_healthy(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self) -> None:
+        async with self._lock:
+            if not self.is_healthy():
+                await self._launch()
+
+    async def stop(self) -> None:
+        async with self._lock:
+            await self._close_browser()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    async def render_pdf(
+        self, html: str, assets: dict[str, RenderAsset] | None = None
+    ) -> bytes:
+        async with self._slots:
+            page = await self._checkout()
+            reusable = False
+            try:
+                if assets is None:
+                    await page.set_content(html, wait_until="networkidle")
+                else:
+                    await _set_content_with_assets(page, html, assets)
+                pdf_bytes = await page.pdf(
+                    format="A4",
+                    print_background=True,
+                    margin=_PDF_MARGIN,
+                )
+                reusable = True
+            finally:
+                await self._release(page, reusable)
+        return pdf_bytes
+
+    async def _launch(self) -> None:
+        await self._close_browser()
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch()
+
+    async def _close_browser(self) -> None:
+        pages = self._idle_pages
+        self._idle_pages = []
+        for page in pages:
+            await _close_page(page)
+        browser = self._browser
+        self._browser = None
+        if browser is not None and browser.is_connected():
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _checkout(self) -> Page:
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if self.is_healthy() and not page.is_closed():
+                return page
+            await _close_page(page)
+        async with self._lock:
+            if not self.is_healthy():
+                await self._launch()
+            browser = self._browser
+        context = await browser.new_context()
+        return await context.new_page()
+
+    async def _release(self, page: Page, reusable: bool) -> None:
+        if (
+            reusable
+            and self.is_healthy()
+            and not page.is_closed()
+            and len(self._idle_pages) < self._pool_size
+        ):
+            self._idle_pages.append(page)
+            return
+        await _close_page(page)
+
+
+def _normalize_url(url: str) -> str:
+    return urllib.parse.unquote(url)
+
+
+async def _set_content_with_assets(
+    page: Page, html: str, assets: dict[str, RenderAsset]
+) -> None:
+    by_url = {_normalize_url(url): asset for url, asset in assets.items()}
+
+    def _matches(url: str) -> bool:
+        return _normalize_url(url) in by_url
+
+    async def _fulfill(route: Route) -> None:
+        asset = by_url.get(_normalize_url(route.request.url))
+        if asset is None:
+            await route.continue_()
+            return
+        body, content_type = asset
+        await route.fulfill(status=200, body=body, content_type=content_type)
+
+    await page.route(_matches, _fulfill)
+    try:
+        await page.set_content(html, wait_until="load")
+        await page.evaluate(_IMAGES_READY_SCRIPT)
+    finally:
+        await page.unroute(_matches, _fulfill)
+
+
+async def _close_page(page: Page) -> None:
+    try:
+        await page.context.close()
+    except Exception:
+        pass
+
+
+_renderer: ManualRenderer | None = None
+
+
+def get_renderer() -> ManualRenderer:
+    global _renderer
+    if _renderer is None:
+        settings = get_settings()
+        _renderer = ManualRenderer(settings.renderer_pool_size)
+    return _renderer
@@ -1,19 +1,51 @@
-import json
+import asyncio
+import logging
 import urllib.parse
-import urllib.request
+from dataclasses import dataclass
 from typing import Any
 
+import httpx
+
 from app.core.config import get_settings
 from app.services.ocr import detect_text_from_bytes
 from app.services.storage import upload_bytes
+from app.utils.concurrency import run_blocking
+
+logger = logging.getLogger(__name__)
 
 SEARCH_API_URL = "https://www.googleapis.com/customsearch/v1"
 
+_SEARCH_TIMEOUT_SECONDS = 10
+_PDF_TIMEOUT_SECONDS = 15
+# Added to _score_item so a city document wins ties against its prefecture.
+_SCOPE_WEIGHTS = {"city": 3, "prefecture": 0}
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=_SEARCH_TIMEOUT_SECONDS, follow_redirects=True
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
-def _fetch_json(url: str) -> dict[str, Any]:
-    with urllib.request.urlopen(url, timeout=10) as response:
-        data = response.read()
-    return json.loads(data.decode("utf-8"))
+
+@dataclass(frozen=True)
+class _Candidate:
+    score: int
+    order: tuple[int, int]
+    scope: str
+    query: str
+    item: dict[str, Any]
 
 
 def _slugify_ascii(text: str | None) -> str | None:
@@ -126,8 +158,105 @@ def _extract_slugs(
     return city_slug, pref_slug
 
 
-def search_official_manual(
+def official_manual_queries(
     city: str | None, prefecture: str | None, place: dict[str, Any] | None = None
+) -> list[tuple[str, str]]:
+    city_slug, pref_slug = _extract_slugs(city, prefecture, place)
+    return _build_query(city, prefecture, city_slug, pref_slug)
+
+
+async def _run_query(
+    client: httpx.AsyncClient, position: int, scope: str, query: str
+) -> tuple[int, str, str, list[dict[str, Any]]]:
+    settings = get_settings()
+    params = {
+        "key": settings.google_api_key,
+        "cx": settings.google_search_cx,
+        "q": query,
+        "num": 3,
+    }
+    response = await client.get(SEARCH_API_URL, params=params)
+    # Quota and server errors may carry an HTML or empty body. raise_for_status
+    # is avoided because its message includes the URL with the API key.
+    if response.is_error:
+        raise RuntimeError(f"Google search failed with HTTP {response.status_code}")
+    data = response.json()
+    if data.get("error"):
+        raise RuntimeError(data["error"].get("message") or "Google search failed")
+    return position, scope, query, data.get("items") or []
+
+
+async def _ranked_candidates(
+    city: str | None,
+    prefecture: str | None,
+    city_slug: str | None,
+    pref_slug: str | None,
+) -> list[_Candidate]:
+    threshold = get_settings().search_confident_score
+    client = get_http_client()
+    tasks = [
+        asyncio.create_task(_run_query(client, position, scope, query))
+        for position, (scope, query) in enumerate(
+            _build_query(city, prefecture, city_slug, pref_slug)
+        )
+    ]
+    candidates: dict[str, _Candidate] = {}
+    errors: list[Exception] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                position, scope, query, raw_items = await next_done
+            except Exception as exc:
+                logger.warning("Search query failed: %s", exc)
+                errors.append(exc)
+                continue
+            keywords: list[str] = []
+            if scope == "city" and city:
+                keywords.append(city)
+            if prefecture:
+                keywords.append(prefecture)
+            for rank, item in enumerate(raw_items):
+                link = item.get("link")
+                if not link:
+                    continue
+                candidate = _Candidate(
+                    score=_score_item(item, keywords, city, city_slug, pref_slug)
+                    + _SCOPE_WEIGHTS.get(scope, 0),
+                    order=(-position, -rank),
+                    scope=scope,
+                    query=query,
+                    item=item,
+                )
+                current = candidates.get(link)
+                if current is None or (candidate.score, candidate.order) > (
+                    current.score,
+                    current.order,
+                ):
+                    candidates[link] = candidate
+            if any(entry.score >= threshold for entry in candidates.values()):
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    if not candidates and errors:
+        raise RuntimeError(str(errors[0]))
+    return sorted(
+        candidates.values(), key=lambda entry: (entry.score, entry.order), reverse=True
+    )
+
+
+def _store_and_extract(
+    bucket: str, blob_name: str, file_bytes: bytes, content_type: str
+) -> str:
+    gcs_uri = upload_bytes(bucket, blob_name, file_bytes, content_type)
+    return detect_text_from_bytes(file_bytes, blob_name, content_type, gcs_uri)
+
+
+async def search_official_manual(
+    city: str | None,
+    prefecture: str | None,
+    place: dict[str, Any] | None = None,
+    pdf_blob_name: str | None = None,
 ) -> dict[str, Any] | None:
     settings = get_settings()
     if not settings.google_api_key:
@@ -136,63 +265,45 @@ def search_official_manual(
         raise RuntimeError("GOOGLE_SEARCH_CX is not set")
 
     city_slug, pref_slug = _extract_slugs(city, prefecture, place)
-
-    for scope, query in _build_query(city, prefecture, city_slug, pref_slug):
-        params = {
-            "key": settings.google_api_key,
-            "cx": settings.google_search_cx,
-            "q": query,
-            "num": 3,
-        }
-        url = f"{SEARCH_API_URL}?{urllib.parse.urlencode(params)}"
-        data = _fetch_json(url)
-        if data.get("error"):
-            raise RuntimeError(data["error"].get("message") or "Google search failed")
-        raw_items = data.get("items") or []
-        if not raw_items:
-            continue
-        keywords: list[str] = []
-        if scope == "city" and city:
-            keywords.append(city)
-        if prefecture:
-            keywords.append(prefecture)
-        items = sorted(
-            raw_items,
-            key=lambda item: _score_item(item, keywords, city, city_slug, pref_slug),
-            reverse=True,
-        )
-        item = next((entry for entry in items if entry.get("link")), None)
-        if not item:
-            continue
-        link = item.get("link") or ""
-        title = item.get("title") or ""
-        reference_text = None
-        if link.endswith(".pdf") and settings.gcs_bucket:
-            try:
-                with urllib.request.urlopen(link, timeout=15) as response:
-                    file_bytes = response.read()
-                    content_type = (
-                        response.headers.get_content_type() or "application/pdf"
-                    )
-                blob_name = (
-                    f"search_cache/{scope}/{urllib.parse.quote_plus(query)}/manual.pdf"
-                )
-                gcs_uri = upload_bytes(
-                    settings.gcs_bucket, blob_name, file_bytes, content_type
-                )
-                reference_text = detect_text_from_bytes(
-                    file_bytes, blob_name, content_type, gcs_uri
-                )
-            except Exception:
-                reference_text = None
-        return {
-            "query": query,
-            "scope": scope,
-            "result": {
-                "title": title,
-                "link": link,
-                "snippet": item.get("snippet"),
-            },
-            "reference_text": reference_text,
-        }
-    return None
+    candidates = await _ranked_candidates(city, prefecture, city_slug, pref_slug)
+    if not candidates:
+        return None
+    best = candidates[0]
+    scope, query, item = best.scope, best.query, best.item
+    link = item.get("link") or ""
+    title = item.get("title") or ""
+    reference_text = None
+    stored_blob_name = None
+    if link.endswith(".pdf") and settings.gcs_bucket:
+        try:
+            response = await get_http_client().get(link, timeout=_PDF_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            file_bytes = response.content
+            content_type = (
+                response.headers.get("content-type", "").split(";")[0].strip()
+                or "application/pdf"
+            )
+            blob_name = pdf_blob_name or (
+                f"search_cache/{scope}/{urllib.parse.quote_plus(query)}/manual.pdf"
+            )
+            reference_text = await run_blocking(
+                _store_and_extract,
+                settings.gcs_bucket,
+                blob_name,
+                file_bytes,
+                content_type,
+            )
+            stored_blob_name = blob_name
+        except Exception:
+            reference_text = None
+    return {
+        "query": query,
+        "scope": scope,
+        "result": {
+            "title": title,
+            "link": link,
+            "snippet": item.get("snippet"),
+        },
+        "pdf_blob_name": stored_blob_name,
+        "reference_text": reference_text,
+    }
@@ -76,6 +76,8 @@ def get_session(session_id: str) -> dict[str, Any] | None:
         "updated_at": updated_at,
         "inputs": payload.get("inputs"),
         "agentic": payload.get("agentic"),
+        "job": payload.get("job"),
+        "reference": payload.get("reference"),
     }
 
 
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import get_settings
+from app.services.renderer import get_renderer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SpeculativeRender:
+    html: str
+    markdown: str
+    pdf_bytes: bytes
+
+
+@dataclass
+class _Pending:
+    key: str
+    task: asyncio.Task[SpeculativeRender]
+    settled_at: float | None = None
+
+
+_pending: dict[str, _Pending] = {}
+_stats = {
+    "started": 0,
+    "skipped": 0,
+    "promoted": 0,
+    "discarded": 0,
+    "failed": 0,
+    "expired": 0,
+}
+
+
+def proposal_key(proposal: str, *inputs: Any) -> str:
+    source = json.dumps([proposal.strip(), *inputs], ensure_ascii=False, default=str)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _running() -> int:
+    return sum(1 for pending in _pending.values() if not pending.task.done())
+
+
+def _evict_settled() -> None:
+    # Finished renders hold PDF bytes until the proposal is accepted; drop the
+    # ones nobody took in time and keep at most a bounded number around.
+    settings = get_settings()
+    now = time.monotonic()
+    settled = sorted(
+        (
+            (pending.settled_at, session_id)
+            for session_id, pending in _pending.items()
+            if pending.settled_at is not None
+        ),
+        reverse=True,
+    )
+    for position, (settled_at, session_id) in enumerate(settled):
+        if (
+            position >= settings.speculation_max_settled
+            or now - settled_at > settings.speculation_ttl_seconds
+        ):
+            del _pending[session_id]
+            _stats["expired"] += 1
+
+
+def _settle(session_id: str, task: asyncio.Task[SpeculativeRender]) -> None:
+    if not task.cancelled():
+        error = task.exception()
+        if error is None:
+            pending = _pending.get(session_id)
+            if pending is not None and pending.task is task:
+                pending.settled_at = time.monotonic()
+            _evict_settled()
+            return
+        logger.warning("Speculative render for %s failed", session_id, exc_info=error)
+        _stats["failed"] += 1
+    pending = _pending.get(session_id)
+    if pending is not None and pending.task is task:
+        del _pending[session_id]
+
+
+def cancel_speculation(session_id: str) -> None:
+    pending = _pending.pop(session_id, None)
+    if pending is None:
+        return
+    if not pending.task.done():
+        pending.task.cancel()
+    _stats["discarded"] += 1
+
+
+def start_speculation(
+    session_id: str,
+    key: str,
+    render: Callable[[], Coroutine[Any, Any, SpeculativeRender]],
+) -> bool:
+    settings = get_settings()
+    _evict_settled()
+    current = _pending.get(session_id)
+    if current is not None and current.key == key:
+        return True
+    cancel_speculation(session_id)
+    # Speculation only uses spare capacity: it never queues behind real renders.
+    if (
+        not settings.speculation_enabled
+        or _running() >= settings.speculation_max_concurrency
+        or get_renderer().is_saturated()
+    ):
+        _stats["skipped"] += 1
+        return False
+
+    task = asyncio.create_task(render())
+    task.add_done_callback(lambda done: _settle(session_id, done))
+    _pending[session_id] = _Pending(key, task)
+    _stats["started"] += 1
+    return True
+
+
+async def take_speculation(session_id: str, key: str) -> SpeculativeRender | None:
+    pending = _pending.get(session_id)
+    if pending is None:
+        return None
+    if pending.key != key:
+        cancel_speculation(session_id)
+        return None
+    try:
+        result = await asyncio.shield(pending.task)
+    except asyncio.CancelledError:
+        if not pending.task.cancelled():
+            raise
+        return None
+    except Exception:
+        return None
+    finally:
+        if _pending.get(session_id) is pending and pending.task.done():
+            del _pending[session_id]
+    _stats["promoted"] += 1
+    return result
+
+
+def speculation_stats() -> dict[str, int]:
+    return {**_stats, "running": _running()}
@@ -1,3 +1,6 @@
+from typing import Any, BinaryIO
+
+from google.api_core.exceptions import NotFound
 from google.cloud import storage
 
 
@@ -11,6 +14,50 @@ def upload_bytes(
     return f"gs://{bucket_name}/{blob_name}"
 
 
+def upload_file(
+    bucket_name: str,
+    blob_name: str,
+    file_obj: BinaryIO,
+    content_type: str,
+    chunk_size: int | None = None,
+) -> str:
+    client = storage.Client()
+    bucket = client.bucket(bucket_name)
+    blob = bucket.blob(blob_name, chunk_size=chunk_size)
+    file_obj.seek(0)
+    blob.upload_from_file(file_obj, content_type=content_type)
+    return f"gs://{bucket_name}/{blob_name}"
+
+
+def get_blob_metadata(bucket_name: str, blob_name: str) -> dict[str, Any] | None:
+    client = storage.Client()
+    bucket = client.bucket(bucket_name)
+    blob = bucket.get_blob(blob_name)
+    if blob is None:
+        return None
+    return {"content_type": blob.content_type, "size": blob.size}
+
+
+def download_bytes(bucket_name: str, blob_name: str) -> bytes | None:
+    client = storage.Client()
+    bucket = client.bucket(bucket_name)
+    blob = bucket.blob(blob_name)
+    try:
+        return blob.download_as_bytes()
+    except NotFound:
+        return None
+
+
+def copy_blob(bucket_name: str, source_name: str, destination_name: str) -> bool:
+    client = storage.Client()
+    bucket = client.bucket(bucket_name)
+    try:
+        bucket.copy_blob(bucket.blob(source_name), bucket, destination_name)
+    except NotFound:
+        return False
+    return True
+
+
 def public_url(bucket_name: str, blob_name: str) -> str:
     return f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
 
@@ -0,0 +1,92 @@
+import asyncio
+import math
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceededError(TimeoutError):
+    pass
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 100) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int) -> float | None:
+        if len(self._samples) < max(min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        position = min(math.ceil(fraction * len(ordered)) - 1, len(ordered) - 1)
+        return ordered[max(position, 0)]
+
+
+@dataclass
+class HedgeResult(Generic[T]):
+    value: T
+    hedged: bool
+    hedge_won: bool
+    latency: float
+
+
+async def hedged_call(
+    factory: Callable[[], Awaitable[T]],
+    hedge_delay: float | None,
+    timeout: float,
+    discard: Callable[[T], None] | None = None,
+) -> HedgeResult[T]:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    primary = asyncio.ensure_future(factory())
+    hedge: asyncio.Future[T] | None = None
+    pending = {primary}
+    error: BaseException | None = None
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"Call exceeded {timeout:.1f}s deadline")
+            wait_seconds = remaining
+            if hedge is None and hedge_delay is not None:
+                hedge_at = started + hedge_delay
+                wait_seconds = min(remaining, max(hedge_at - loop.time(), 0))
+            done, pending = await asyncio.wait(
+                pending, timeout=wait_seconds, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if hedge is None and hedge_delay is not None:
+                    hedge = asyncio.ensure_future(factory())
+                    pending.add(hedge)
+                continue
+            winner: asyncio.Future[T] | None = None
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                elif winner is None:
+                    winner = task
+                elif discard is not None:
+                    # Both calls finished together: release the losing result.
+                    discard(task.result())
+            if winner is not None:
+                # Latency is measured from the primary call so hedged wins still
+                # reflect what the caller waited for.
+                return HedgeResult(
+                    value=winner.result(),
+                    hedged=hedge is not None,
+                    hedge_won=winner is hedge,
+                    latency=loop.time() - started,
+                )
+            if not pending and error is not None:
+                raise error
+    finally:
+        # Cancelling only stops waiting: work a factory handed to threads or a
+        # remote service can still run to completion after this returns.
+        for task in pending:
+            task.cancel()
@@ -14,3 +14,121 @@ def parse_json_response(text: str) -> dict[str, Any] | None:
         return json.loads(match.group(0))
     except json.JSONDecodeError:
         return None
+
+
+def is_json_response(text: str) -> bool:
+    return parse_json_response(text) is not None
+
+
+_PARTIAL_ESCAPE_RE = re.compile(r"\\u[0-9a-fA-F]{0,3}$")
+
+
+def _decode_partial_string(raw: str) -> str | None:
+    trailing = len(raw) - len(raw.rstrip("\\"))
+    if trailing % 2:
+        raw = raw[:-1]
+    raw = _PARTIAL_ESCAPE_RE.sub("", raw)
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        return None
+
+
+# Emits ("partial" | "value", key, text) for top-level strings and
+# ("item", key, value) for each completed element of a top-level array.
+class IncrementalJsonParser:
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._expect_key = False
+        self._key: str | None = None
+        self._value_kind: str | None = None
+        self._item_start = -1
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+    def feed(self, chunk: str) -> list[tuple[str, str, Any]]:
+        self._buffer += chunk
+        events: list[tuple[str, str, Any]] = []
+        while self._pos < len(self._buffer):
+            self._consume(self._buffer[self._pos], self._pos, events)
+            self._pos += 1
+        if (
+            self._in_string
+            and self._depth == 1
+            and self._value_kind == "string"
+            and self._key is not None
+        ):
+            partial = _decode_partial_string(self._buffer[self._string_start + 1 :])
+            if partial is not None:
+                events.append(("partial", self._key, partial))
+        return events
+
+    def _consume(self, char: str, index: int, events: list) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._close_string(index, events)
+            return
+        if not self._started:
+            if char == "{":
+                self._started = True
+                self._depth = 1
+                self._expect_key = True
+            return
+        if self._depth == 0:
+            return
+        if char == '"':
+            self._in_string = True
+            self._string_start = index
+            if self._depth == 1 and not self._expect_key:
+                self._value_kind = "string"
+            elif self._depth == 2 and self._value_kind == "array":
+                self._item_start = index
+        elif char in "{[":
+            if self._depth == 1:
+                self._value_kind = "array" if char == "[" else "other"
+            elif self._depth == 2 and self._value_kind == "array":
+                self._item_start = index
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 2 and self._item_start >= 0:
+                self._emit_item(index, events)
+            elif self._depth == 1:
+                self._value_kind = None
+        elif char == "," and self._depth == 1:
+            self._expect_key = True
+            self._value_kind = None
+
+    def _close_string(self, index: int, events: list) -> None:
+        raw = self._buffer[self._string_start : index + 1]
+        if self._depth == 1 and self._expect_key:
+            self._key = json.loads(raw)
+            self._expect_key = False
+        elif self._depth == 1 and self._value_kind == "string" and self._key:
+            events.append(("value", self._key, json.loads(raw)))
+            self._value_kind = None
+        elif self._depth == 2 and self._item_start == self._string_start:
+            self._emit_item(index, events)
+
+    def _emit_item(self, index: int, events: list) -> None:
+        raw = self._buffer[self._item_start : index + 1]
+        self._item_start = -1
+        if self._key is None:
+            return
+        try:
+            events.append(("item", self._key, json.loads(raw)))
+        except json.JSONDecodeError:
+            return
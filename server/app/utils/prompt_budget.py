@@ -0,0 +1,30 @@
+import json
+from typing import Any
+
+# Gemini tokenizes CJK text at roughly one token per character and other text
+# at roughly four characters per token; this is close enough for budgeting.
+_ASCII_CHARS_PER_TOKEN = 4
+_TRUNCATION_MARK = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    wide = sum(1 for char in text if ord(char) > 0x2E7F)
+    narrow = len(text) - wide
+    return wide + -(-narrow // _ASCII_CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    if budget <= 0:
+        return ""
+    if estimate_tokens(text) <= budget:
+        return text
+    used = 0
+    for position, char in enumerate(text):
+        used += 4 if ord(char) > 0x2E7F else 1
+        if used > budget * _ASCII_CHARS_PER_TOKEN:
+            return text[:position].rstrip() + _TRUNCATION_MARK
+    return text
+
+
+def compact_json(payload: Any) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
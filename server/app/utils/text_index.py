@@ -0,0 +1,116 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+DEFAULT_NGRAM_SIZES = (2, 3)
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def char_ngrams(
+    text: str, sizes: tuple[int, ...] = DEFAULT_NGRAM_SIZES
+) -> Counter[str]:
+    normalized = normalize_text(text)
+    grams: Counter[str] = Counter()
+    for size in sizes:
+        for start in range(len(normalized) - size + 1):
+            gram = normalized[start : start + size]
+            if not gram.strip():
+                continue
+            grams[gram] += 1
+    return grams
+
+
+def _idf(documents: int, frequency: int) -> float:
+    return math.log((documents + 1) / (frequency + 1)) + 1e-6
+
+
+class TfidfIndex:
+    def __init__(
+        self,
+        idf: dict[str, float],
+        vectors: list[dict[str, float]],
+        sizes: tuple[int, ...] = DEFAULT_NGRAM_SIZES,
+        documents: int | None = None,
+    ) -> None:
+        self.idf = idf
+        self.vectors = vectors
+        self.sizes = sizes
+        self.documents = documents if documents is not None else len(vectors)
+        # Grams the index has never seen are rarer than any indexed gram.
+        self.unseen_idf = _idf(self.documents, 0)
+
+    @classmethod
+    def build(
+        cls, documents: list[str], sizes: tuple[int, ...] = DEFAULT_NGRAM_SIZES
+    ) -> "TfidfIndex":
+        counts = [char_ngrams(document, sizes) for document in documents]
+        document_frequency: Counter[str] = Counter()
+        for grams in counts:
+            document_frequency.update(grams.keys())
+        total = len(documents)
+        idf = {
+            gram: _idf(total, frequency)
+            for gram, frequency in document_frequency.items()
+        }
+        index = cls(idf, [], sizes, total)
+        index.vectors = [index._weigh(grams) for grams in counts]
+        return index
+
+    def _weigh(self, grams: Counter[str]) -> dict[str, float]:
+        weights = {
+            gram: (1 + math.log(count)) * self.idf.get(gram, self.unseen_idf)
+            for gram, count in grams.items()
+        }
+        norm = math.sqrt(sum(value * value for value in weights.values()))
+        if not norm:
+            return {}
+        # Unseen grams still count towards the norm but can never match, so
+        # they are dropped only after normalising.
+        return {
+            gram: value / norm for gram, value in weights.items() if gram in self.idf
+        }
+
+    def vectorize(self, text: str) -> dict[str, float]:
+        return self._weigh(char_ngrams(text, self.sizes))
+
+    def search(self, text: str, top_k: int = 5) -> list[tuple[int, float]]:
+        query = self.vectorize(text)
+        if not query:
+            return []
+        scores: list[tuple[int, float]] = []
+        for position, vector in enumerate(self.vectors):
+            if len(vector) < len(query):
+                small, large = vector, query
+            else:
+                small, large = query, vector
+            score = sum(value * large.get(gram, 0.0) for gram, value in small.items())
+            if score > 0:
+                scores.append((position, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:top_k]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "sizes": list(self.sizes),
+            "documents": self.documents,
+            "idf": self.idf,
+            "vectors": self.vectors,
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict[str, Any]) -> "TfidfIndex":
+        sizes = tuple(payload.get("sizes") or DEFAULT_NGRAM_SIZES)
+        return cls(
+            payload.get("idf") or {},
+            payload.get("vectors") or [],
+            sizes,
+            payload.get("documents"),
+        )
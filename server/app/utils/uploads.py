@@ -0,0 +1,59 @@
+from collections.abc import AsyncIterator
+
+from starlette.datastructures import FormData, Headers
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+
+class UploadTooLargeError(MultiPartException):
+    pass
+
+
+async def _limit_stream(
+    stream: AsyncIterator[bytes], max_bytes: int
+) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLargeError(
+                f"Request body exceeds the limit of {max_bytes} bytes."
+            )
+        yield chunk
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    def __init__(
+        self,
+        headers: Headers,
+        stream: AsyncIterator[bytes],
+        max_file_bytes: int,
+        max_request_bytes: int,
+        **kwargs: int,
+    ) -> None:
+        super().__init__(headers, _limit_stream(stream, max_request_bytes), **kwargs)
+        self._max_file_bytes = max_file_bytes
+        self._current_part_bytes = 0
+
+    def on_part_begin(self) -> None:
+        self._current_part_bytes = 0
+        super().on_part_begin()
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current_part.file is not None:
+            self._current_part_bytes += end - start
+            if self._current_part_bytes > self._max_file_bytes:
+                raise UploadTooLargeError(
+                    f"{self._current_part.file.filename} exceeds the limit of "
+                    f"{self._max_file_bytes} bytes."
+                )
+        super().on_part_data(data, start, end)
+
+
+async def parse_limited_multipart(
+    headers: Headers,
+    stream: AsyncIterator[bytes],
+    max_file_bytes: int,
+    max_request_bytes: int,
+) -> FormData:
+    parser = LimitedMultiPartParser(headers, stream, max_file_bytes, max_request_bytes)
+    return await parser.parse()
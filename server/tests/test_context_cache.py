@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.services import context_cache
+from app.services.context_cache import (
+    InMemoryContextCacheProvider,
+    generate_with_context_cache,
+    set_context_cache_provider,
+)
+
+_PREFIX = "instructions and manual context\n"
+
+
+@pytest.fixture
+def provider(monkeypatch: pytest.MonkeyPatch) -> InMemoryContextCacheProvider:
+    monkeypatch.setenv("CONTEXT_CACHE_MIN_TOKENS", "1")
+    monkeypatch.setattr(context_cache, "_provider", None)
+    monkeypatch.setattr(context_cache, "_provider_loaded", False)
+
+    async def generate_text(prompt: str, profile: str) -> str:
+        return f"{profile}:{len(prompt)}"
+
+    provider = InMemoryContextCacheProvider(generate_text)
+    set_context_cache_provider(provider)
+    return provider
+
+
+def test_cached_context_is_created_then_reused(
+    provider: InMemoryContextCacheProvider,
+) -> None:
+    async def scenario() -> None:
+        _, state = await generate_with_context_cache(
+            _PREFIX, "turn 1", "agentic_question", None
+        )
+        first = state["agentic_question"]["name"]
+        assert list(provider.prefixes) == [first]
+
+        text, state = await generate_with_context_cache(
+            _PREFIX, "turn 2", "agentic_question", state
+        )
+
+        assert text == f"agentic_question:{len(_PREFIX + 'turn 2')}"
+        assert state["agentic_question"]["name"] == first
+        assert list(provider.prefixes) == [first]
+
+    asyncio.run(scenario())
+
+
+def test_cached_context_is_replaced_when_prefix_changes(
+    provider: InMemoryContextCacheProvider,
+) -> None:
+    async def scenario() -> None:
+        _, state = await generate_with_context_cache(
+            _PREFIX, "turn 1", "agentic_question", None
+        )
+        stale = state["agentic_question"]["name"]
+
+        _, state = await generate_with_context_cache(
+            _PREFIX + "updated markdown\n", "turn 2", "agentic_question", state
+        )
+
+        current = state["agentic_question"]["name"]
+        assert current != stale
+        assert list(provider.prefixes) == [current]
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.services import generate
+from app.services.generate import generate_manual_html_with_proposal
+from app.services.manual_html import render_manual_html
+
+_MARKDOWN = "# 連絡先\n管理会社に連絡する\n\n# 備蓄\n水を3日分用意する"
+
+
+def _propose(markdown: str, html: str) -> tuple[str, str]:
+    return asyncio.run(
+        generate_manual_html_with_proposal(
+            markdown, html, "備蓄を7日分にする", [], "防災マニュアル", "", "", ""
+        )
+    )
+
+
+def test_legacy_html_without_section_markers_is_kept(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def fail(*args, **kwargs) -> str:
+        raise AssertionError("legacy sessions must not call the LLM")
+
+    monkeypatch.setattr(generate, "ainvoke_text", fail)
+    html = "<html><body><h1>表紙</h1><h2>連絡先</h2></body></html>"
+
+    assert _propose(_MARKDOWN, html) == (html, _MARKDOWN)
+
+
+def test_empty_section_selection_keeps_the_manual(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    profiles: list[str] = []
+
+    async def select_nothing(prompt: str, profile: str, **kwargs) -> str:
+        profiles.append(profile)
+        return '{"section_ids": []}'
+
+    monkeypatch.setattr(generate, "ainvoke_text", select_nothing)
+    html = render_manual_html(_MARKDOWN, [], "防災マニュアル", "", "", "")
+
+    assert _propose(_MARKDOWN, html) == (html, _MARKDOWN)
+    assert profiles == ["html_patch"]
@@ -0,0 +1,49 @@
+import asyncio
+
+from app.utils.hedging import hedged_call
+
+
+def test_hedged_win_records_latency_from_primary_start() -> None:
+    async def scenario() -> None:
+        calls = 0
+
+        async def factory() -> str:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(1.0 if calls == 1 else 0.05)
+            return f"call-{calls}"
+
+        result = await hedged_call(factory, 0.1, 5.0)
+
+        assert result.value == "call-2"
+        assert result.hedge_won
+        assert result.latency >= 0.15
+
+    asyncio.run(scenario())
+
+
+def test_losing_result_is_discarded_when_both_finish_together() -> None:
+    async def scenario() -> None:
+        release = asyncio.Event()
+        discarded: list[str] = []
+        calls = 0
+
+        async def factory() -> str:
+            nonlocal calls
+            calls += 1
+            name = f"call-{calls}"
+            await release.wait()
+            return name
+
+        async def open_gate() -> None:
+            await asyncio.sleep(0.1)
+            release.set()
+
+        gate = asyncio.create_task(open_gate())
+        result = await hedged_call(factory, 0.01, 5.0, discarded.append)
+        await gate
+
+        assert result.hedged
+        assert discarded == ["call-2" if result.value == "call-1" else "call-1"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,29 @@
+from app.services.manual_html import render_section_html
+
+
+def test_two_space_nested_list_renders_nested() -> None:
+    markdown = "## 備蓄\n\n- 水\n  - 1人1日3L\n  - 3日分\n- 食料\n"
+
+    html = render_section_html(markdown, 0, [])
+
+    assert html.count("<ul>") == 2
+    assert "<li>水<ul>\n<li>1人1日3L</li>" in html
+    assert "<li>食料</li>" in html
+
+
+def test_ordered_list_with_nested_bullets() -> None:
+    markdown = "## 手順\n\n1. 火を消す\n   - ガスの元栓\n2. 避難する\n"
+
+    html = render_section_html(markdown, 0, [])
+
+    assert "<ol>" in html
+    assert "<ul>\n<li>ガスの元栓</li>\n</ul>" in html
+
+
+def test_fenced_code_is_not_a_heading() -> None:
+    markdown = "## 連絡\n\n```\n# 119\n```\n"
+
+    html = render_section_html(markdown, 0, [])
+
+    assert "<pre><code># 119\n</code></pre>" in html
+    assert html.count("<h2>") == 1
@@ -0,0 +1,93 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ocr
+from app.services.ocr import _download_shard
+
+
+def _shard(name: str, texts: list[str]) -> SimpleNamespace:
+    payload = {"responses": [{"fullTextAnnotation": {"text": text}} for text in texts]}
+    data = json.dumps(payload).encode("utf-8")
+    return SimpleNamespace(name=name, download_as_bytes=lambda: data)
+
+
+def test_shard_pages_are_numbered_from_the_shard_offset() -> None:
+    first = _download_shard(
+        _shard("vision-output/job/output/output-1-to-2.json", ["a", "b"])
+    )
+    second = _download_shard(
+        _shard("vision-output/job/output/output-3-to-4.json", ["c", "d"])
+    )
+
+    assert {**first, **second} == {1: "a", 2: "b", 3: "c", 4: "d"}
+
+
+class _FakeOperation:
+    def __init__(self) -> None:
+        self.cancelled = False
+
+    def done(self) -> bool:
+        return self.cancelled
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+def _fake_vision(
+    monkeypatch: pytest.MonkeyPatch, shards: list[SimpleNamespace]
+) -> tuple[_FakeOperation, list[str], list[str]]:
+    operation = _FakeOperation()
+    sources: list[str] = []
+    deleted: list[str] = []
+
+    def annotate(requests: list) -> _FakeOperation:
+        sources.append(requests[0].input_config.gcs_source.uri)
+        return operation
+
+    bucket = SimpleNamespace(list_blobs=lambda prefix: shards)
+    monkeypatch.setenv("GCS_BUCKET", "bucket")
+    monkeypatch.setenv("OCR_MAX_PAGES", "2")
+    monkeypatch.setattr(
+        ocr.storage, "Client", lambda: SimpleNamespace(bucket=lambda name: bucket)
+    )
+    monkeypatch.setattr(
+        ocr.vision,
+        "ImageAnnotatorClient",
+        lambda: SimpleNamespace(async_batch_annotate_files=annotate),
+    )
+    monkeypatch.setattr(
+        ocr, "delete_prefix", lambda bucket, prefix: deleted.append(prefix)
+    )
+    return operation, sources, deleted
+
+
+def test_whole_document_ocr_stops_at_the_page_cap(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    shards = [
+        _shard("job/output/output-1-to-2.json", ["a", "b"]),
+        _shard("job/output/output-3-to-4.json", ["c", "d"]),
+    ]
+    operation, _, deleted = _fake_vision(monkeypatch, shards)
+
+    pages = ocr._ocr_pdf_pages(b"", "manual.pdf", "gs://bucket/manual.pdf")
+
+    assert pages == {1: "a", 2: "b"}
+    assert operation.cancelled
+    assert deleted
+
+
+def test_subset_failure_falls_back_to_the_original_file(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    shards = [_shard("job/output/output-1-to-3.json", ["a", "b", "c"])]
+    _, sources, _ = _fake_vision(monkeypatch, shards)
+
+    pages = ocr._ocr_pdf_pages(
+        b"not a pdf", "manual.pdf", "gs://bucket/manual.pdf", [1, 3]
+    )
+
+    assert sources == ["gs://bucket/manual.pdf"]
+    assert pages == {1: "a", 2: "b", 3: "c"}
@@ -0,0 +1,66 @@
+import json
+import random
+from typing import Any
+
+import pytest
+
+from app.utils.parsing import IncrementalJsonParser, parse_json_response
+
+_MARKDOWN = (
+    '# 連絡先\n"管理会社" に連絡する {至急}\n'
+    "パス: C:\\\\備蓄\\\\リスト と \\u3042 の表記\n"
+    "- [ ] 水 3L × 3日分"
+)
+_PROMPTS = [
+    {"id": "illust-1", "prompt": '消火器の "使い方"', "alt": None},
+    {"id": "illust-2", "prompt": "避難経路 [A] → {B}\\", "alt": "地図"},
+]
+_PAYLOAD = {"markdown": _MARKDOWN, "illustration_prompts": _PROMPTS, "version": 2}
+
+
+def _chunks(text: str, rng: random.Random) -> list[str]:
+    chunks: list[str] = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 7)
+        chunks.append(text[position : position + size])
+        position += size
+    return chunks
+
+
+def _feed(chunks: list[str]) -> list[tuple[str, str, Any]]:
+    parser = IncrementalJsonParser()
+    events: list[tuple[str, str, Any]] = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    assert parse_json_response(parser.text) == _PAYLOAD
+    return events
+
+
+def _check(events: list[tuple[str, str, Any]]) -> None:
+    values = [value for kind, key, value in events if kind == "value"]
+    partials = [value for kind, key, value in events if kind == "partial"]
+    items = [value for kind, key, value in events if kind == "item"]
+
+    assert values == [_MARKDOWN]
+    assert all(_MARKDOWN.startswith(partial) for partial in partials)
+    assert items == _PROMPTS
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunking_yields_the_same_events(seed: int) -> None:
+    text = json.dumps(_PAYLOAD, ensure_ascii=False)
+
+    _check(_feed(_chunks(text, random.Random(seed))))
+
+
+def test_ascii_escaped_output_split_inside_escapes() -> None:
+    text = json.dumps(_PAYLOAD)
+
+    _check(_feed(list(text)))
+
+
+def test_fenced_output_is_parsed() -> None:
+    text = f"```json\n{json.dumps(_PAYLOAD, ensure_ascii=False, indent=2)}\n```"
+
+    _check(_feed(_chunks(text, random.Random(0))))
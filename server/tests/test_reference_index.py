@@ -0,0 +1,31 @@
+from app.services.reference_index import clean_reference_text
+
+
+def test_emergency_numbers_in_body_are_kept() -> None:
+    text = "火災のとき\n119\n事件のとき\n110\n安否確認\n171\n連絡してください"
+
+    assert clean_reference_text(text).splitlines() == text.splitlines()
+
+
+def test_page_numbers_at_page_edges_are_removed() -> None:
+    text = "1\n避難経路\n119\n本文\n2\f- 3 -\n備蓄品\n110\n4 ページ"
+
+    assert clean_reference_text(text).splitlines() == [
+        "避難経路",
+        "119",
+        "本文",
+        "備蓄品",
+        "110",
+    ]
+
+
+def test_consecutive_page_numbers_without_page_breaks_are_removed() -> None:
+    text = "避難経路\n12\n備蓄品\n13\n連絡先\n119\n14\n要支援者"
+
+    assert clean_reference_text(text).splitlines() == [
+        "避難経路",
+        "備蓄品",
+        "連絡先",
+        "119",
+        "要支援者",
+    ]
@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.services import reference_prefetch, sessions
+from app.services.reference_prefetch import prefetched_reference
+
+
+class _FakeFirestore:
+    def __init__(self, documents: dict[str, dict[str, Any]]) -> None:
+        self._documents = documents
+
+    def collection(self, name: str) -> "_FakeFirestore":
+        return self
+
+    def document(self, session_id: str) -> SimpleNamespace:
+        payload = self._documents.get(session_id)
+        snapshot = SimpleNamespace(
+            id=session_id, exists=payload is not None, to_dict=lambda: payload
+        )
+        return SimpleNamespace(get=lambda: snapshot)
+
+
+def test_finished_prefetch_is_read_back_from_the_session(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    record = {"status": "ready", "search": {"scope": "city", "reference_text": "x"}}
+    documents = {"session-1": {"place": {"city": "A"}, "reference": record}}
+    monkeypatch.setattr(sessions, "_client", lambda: _FakeFirestore(documents))
+    monkeypatch.setattr(reference_prefetch, "_tasks", {})
+
+    session = sessions.get_session("session-1")
+
+    assert asyncio.run(prefetched_reference("session-1", session)) == record
+
+
+def test_failed_prefetch_is_not_used(monkeypatch: pytest.MonkeyPatch) -> None:
+    documents = {"session-1": {"reference": {"status": "failed", "error": "boom"}}}
+    monkeypatch.setattr(sessions, "_client", lambda: _FakeFirestore(documents))
+    monkeypatch.setattr(reference_prefetch, "_tasks", {})
+
+    session = sessions.get_session("session-1")
+
+    assert asyncio.run(prefetched_reference("session-1", session)) is None
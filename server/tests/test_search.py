@@ -0,0 +1,18 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.search import _run_query
+
+
+def test_http_errors_are_reported_before_parsing_the_body() -> None:
+    async def scenario() -> None:
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(503, text="<html>Unavailable</html>")
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            with pytest.raises(RuntimeError, match="HTTP 503"):
+                await _run_query(client, 0, "city", "防災マニュアル")
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.services import speculation
+from app.services.speculation import SpeculativeRender, start_speculation
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(speculation, "_pending", {})
+
+
+async def _render() -> SpeculativeRender:
+    return SpeculativeRender("<html></html>", "# manual", b"%PDF")
+
+
+async def _settle_all() -> None:
+    await asyncio.gather(*(pending.task for pending in speculation._pending.values()))
+    await asyncio.sleep(0)
+
+
+def test_settled_renders_are_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("SPECULATION_MAX_SETTLED", "1")
+
+    async def scenario() -> None:
+        assert start_speculation("session-1", "key-1", _render)
+        await _settle_all()
+        assert start_speculation("session-2", "key-2", _render)
+        await _settle_all()
+
+        assert list(speculation._pending) == ["session-2"]
+
+    asyncio.run(scenario())
+
+
+def test_settled_renders_expire(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("SPECULATION_TTL_SECONDS", "0")
+
+    async def scenario() -> None:
+        assert start_speculation("session-1", "key-1", _render)
+        await _settle_all()
+        assert start_speculation("session-2", "key-2", _render)
+
+        assert "session-1" not in speculation._pending
+
+    asyncio.run(scenario())
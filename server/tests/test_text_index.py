@@ -0,0 +1,52 @@
+import math
+
+from app.core.config import get_settings
+from app.services.illustration_catalog import CatalogEntry, IllustrationCatalog
+from app.utils.text_index import TfidfIndex
+
+_UNRELATED_PROMPT = "マンションの廊下で消火器を構える住民、文字禁止"
+_CATALOG_PROMPTS = ["消火器 消火器", "非常用持ち出し袋", "避難経路の地図"]
+
+
+def _entry(prompt: str) -> CatalogEntry:
+    return {
+        "prompt": prompt,
+        "alt": None,
+        "public_url": f"https://example.com/{len(prompt)}.png",
+        "gcs_uri": None,
+        "content_type": "image/png",
+    }
+
+
+def test_query_norm_includes_unseen_grams() -> None:
+    index = TfidfIndex.build(_CATALOG_PROMPTS)
+
+    vector = index.vectorize(_UNRELATED_PROMPT)
+
+    assert 0 < math.sqrt(sum(value * value for value in vector.values())) < 0.5
+
+
+def test_unrelated_prompt_stays_below_catalog_threshold() -> None:
+    catalog = IllustrationCatalog([_entry(prompt) for prompt in _CATALOG_PROMPTS])
+    prompt = {"id": "illust-1", "prompt": _UNRELATED_PROMPT, "alt": None}
+
+    assert catalog.match(prompt, get_settings().illustration_catalog_threshold) is None
+
+
+def test_identical_prompt_still_matches() -> None:
+    catalog = IllustrationCatalog([_entry(prompt) for prompt in _CATALOG_PROMPTS])
+    prompt = {"id": "illust-1", "prompt": "非常用持ち出し袋", "alt": None}
+
+    match = catalog.match(prompt, get_settings().illustration_catalog_threshold)
+
+    assert match is not None
+    assert match[0]["prompt"] == "非常用持ち出し袋"
+    assert match[1] > 0.99
+
+
+def test_round_trip_keeps_document_count() -> None:
+    index = TfidfIndex.build(_CATALOG_PROMPTS)
+
+    restored = TfidfIndex.from_dict(index.to_dict())
+
+    assert restored.vectorize(_UNRELATED_PROMPT) == index.vectorize(_UNRELATED_PROMPT)